@@ -0,0 +1,52 @@
+"""protocol encapsulation closure
+
+Revision ID: 3c1f9a7d2b04
+Revises: 7977543618c7
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d2b04'
+down_revision = '7977543618c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'protocol_encapsulation_closure',
+        sa.Column('ancestor_id', UUID(as_uuid=True), sa.ForeignKey('protocols.id', ondelete='CASCADE'), primary_key=True, nullable=False),
+        sa.Column('descendant_id', UUID(as_uuid=True), sa.ForeignKey('protocols.id', ondelete='CASCADE'), primary_key=True, nullable=False),
+        sa.Column('paths', sa.BigInteger, nullable=False)
+    )
+
+    op.create_index('ix_protocol_encapsulation_closure_descendant_id', 'protocol_encapsulation_closure', ['descendant_id', 'ancestor_id'])
+
+    # Backfill from the existing encapsulations, counting every distinct path between two protocols.
+    # Paths that would revisit a protocol are cut off, so pre-existing cycles can't loop forever.
+    op.execute("""
+        WITH RECURSIVE walk(ancestor_id, descendant_id, visited) AS (
+            SELECT parent_protocol_id, protocol_id, ARRAY[parent_protocol_id, protocol_id]
+            FROM protocol_encapsulations
+            WHERE parent_protocol_id <> protocol_id
+            UNION ALL
+            SELECT walk.ancestor_id, e.protocol_id, walk.visited || e.protocol_id
+            FROM walk
+            JOIN protocol_encapsulations e ON e.parent_protocol_id = walk.descendant_id
+            WHERE NOT e.protocol_id = ANY(walk.visited)
+        )
+        INSERT INTO protocol_encapsulation_closure (ancestor_id, descendant_id, paths)
+        SELECT ancestor_id, descendant_id, COUNT(*)
+        FROM walk
+        GROUP BY ancestor_id, descendant_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_protocol_encapsulation_closure_descendant_id', table_name='protocol_encapsulation_closure')
+    op.drop_table('protocol_encapsulation_closure')
@@ -0,0 +1,36 @@
+"""protocol changes
+
+Revision ID: 9b2e4c6a1f37
+Revises: 3c1f9a7d2b04
+Create Date: 2026-10-19 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4c6a1f37'
+down_revision = '3c1f9a7d2b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'protocol_changes',
+        sa.Column('seq', sa.BigInteger, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('kind', sa.String(32), nullable=False),
+        sa.Column('protocol_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('encapsulation_id', UUID(as_uuid=True), nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.text('now()'))
+    )
+
+    op.create_index('ix_protocol_changes_user_id_seq', 'protocol_changes', ['user_id', 'seq'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_protocol_changes_user_id_seq', table_name='protocol_changes')
+    op.drop_table('protocol_changes')
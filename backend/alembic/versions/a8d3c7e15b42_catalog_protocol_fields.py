@@ -0,0 +1,26 @@
+"""catalog protocol fields
+
+Revision ID: a8d3c7e15b42
+Revises: f2b6d8a4c913
+Create Date: 2026-10-19 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3c7e15b42'
+down_revision = 'f2b6d8a4c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Fields of catalog protocols have no owner either, they are indexed when the catalog is published
+    op.alter_column('protocol_fields', 'user_id', existing_type=sa.Integer, nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM protocol_fields WHERE user_id IS NULL")
+    op.alter_column('protocol_fields', 'user_id', existing_type=sa.Integer, nullable=False)
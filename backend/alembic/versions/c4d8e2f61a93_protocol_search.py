@@ -0,0 +1,128 @@
+"""protocol search
+
+Revision ID: c4d8e2f61a93
+Revises: 9b2e4c6a1f37
+Create Date: 2026-10-19 12:00:00
+
+"""
+import os
+import xml.etree.ElementTree as ET
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e2f61a93'
+down_revision = '9b2e4c6a1f37'
+branch_labels = None
+depends_on = None
+
+
+PROTOCOL_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+FIELD_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(display_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', replace(coalesce(field_id, ''), '_', ' ')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.add_column('protocols', sa.Column('search_vector', TSVECTOR, sa.Computed(PROTOCOL_SEARCH_VECTOR, persisted=True)))
+    op.create_index('ix_protocols_search_vector', 'protocols', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_protocols_user_id', 'protocols', ['user_id'])
+
+    for column in ['name', 'author', 'description']:
+        op.create_index(f'ix_protocols_{column}_trgm', 'protocols', [column], postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+    op.create_table(
+        'protocol_fields',
+        sa.Column('protocol_id', UUID(as_uuid=True), sa.ForeignKey('protocols.id', ondelete='CASCADE'), primary_key=True, nullable=False),
+        sa.Column('field_id', sa.String, primary_key=True, nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('display_name', sa.String, nullable=False),
+        sa.Column('description', sa.String, nullable=True),
+        sa.Column('search_vector', TSVECTOR, sa.Computed(FIELD_SEARCH_VECTOR, persisted=True))
+    )
+
+    op.create_index('ix_protocol_fields_user_id', 'protocol_fields', ['user_id'])
+    op.create_index('ix_protocol_fields_search_vector', 'protocol_fields', ['search_vector'], postgresql_using='gin')
+
+    for column in ['display_name', 'field_id']:
+        op.create_index(f'ix_protocol_fields_{column}_trgm', 'protocol_fields', [column], postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+    backfill_protocol_fields()
+
+
+PD_NS = "http://www.protocoldescription.com"
+
+
+def read_svg_fields(data: bytes) -> list[dict]:
+    """
+    The pd:field elements of a protocol SVG, read like src/svg/metadata.py did when this migration was
+    written. Copied so the migration keeps working whatever happens to the application code.
+    """
+    root = ET.fromstring(data)
+
+    return [
+        {
+            "id": element.get(f"{{{PD_NS}}}id", ""),
+            "display_name": element.get(f"{{{PD_NS}}}display_name", ""),
+            "description": element.get(f"{{{PD_NS}}}description", ""),
+        }
+        for element in root.iter(f"{{{PD_NS}}}field")
+    ]
+
+
+def backfill_protocol_fields() -> None:
+    """Index the fields of SVGs uploaded before this migration, new uploads are indexed by the API."""
+    connection = op.get_bind()
+
+    for protocol_id, user_id in connection.execute(sa.text("SELECT id, user_id FROM protocols")):
+        path = f"static/{protocol_id}.svg"
+
+        if not os.path.exists(path):
+            continue
+
+        try:
+            with open(path, "rb") as f:
+                fields = read_svg_fields(f.read())
+        except ET.ParseError:
+            continue
+
+        unique_fields = {}
+        for field in fields:
+            if field["id"]:
+                unique_fields.setdefault(field["id"], field)
+
+        for field in unique_fields.values():
+            connection.execute(
+                sa.text("INSERT INTO protocol_fields (protocol_id, field_id, user_id, display_name, description) "
+                        "VALUES (:protocol_id, :field_id, :user_id, :display_name, :description)"),
+                {
+                    "protocol_id": protocol_id,
+                    "field_id": field["id"],
+                    "user_id": user_id,
+                    "display_name": field["display_name"],
+                    "description": field["description"] or None,
+                },
+            )
+
+
+def downgrade() -> None:
+    op.drop_table('protocol_fields')
+
+    for column in ['name', 'author', 'description']:
+        op.drop_index(f'ix_protocols_{column}_trgm', table_name='protocols')
+
+    op.drop_index('ix_protocols_user_id', table_name='protocols')
+    op.drop_index('ix_protocols_search_vector', table_name='protocols')
+    op.drop_column('protocols', 'search_vector')
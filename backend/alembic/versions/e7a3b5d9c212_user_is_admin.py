@@ -0,0 +1,24 @@
+"""user is_admin
+
+Revision ID: e7a3b5d9c212
+Revises: c4d8e2f61a93
+Create Date: 2026-10-19 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b5d9c212'
+down_revision = 'c4d8e2f61a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('is_admin', sa.Boolean, nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'is_admin')
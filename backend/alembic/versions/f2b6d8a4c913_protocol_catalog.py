@@ -0,0 +1,43 @@
+"""protocol catalog
+
+Revision ID: f2b6d8a4c913
+Revises: e7a3b5d9c212
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8a4c913'
+down_revision = 'e7a3b5d9c212'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Catalog protocols have no owner, they are shared by every user
+    op.alter_column('protocols', 'user_id', existing_type=sa.Integer, nullable=True)
+    op.add_column('protocols', sa.Column('catalog_slug', sa.String, nullable=True))
+
+    op.create_check_constraint('ck_protocols_owner_or_catalog', 'protocols', '(user_id IS NULL) <> (catalog_slug IS NULL)')
+    op.create_index(
+        'ix_protocols_catalog_slug_version', 'protocols', ['catalog_slug', 'version'],
+        unique=True, postgresql_where=sa.text('catalog_slug IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    # Closure rows cascade, encapsulations pointing at the catalog have to go first
+    op.execute("""
+        DELETE FROM protocol_encapsulations
+        WHERE protocol_id IN (SELECT id FROM protocols WHERE user_id IS NULL)
+           OR parent_protocol_id IN (SELECT id FROM protocols WHERE user_id IS NULL)
+    """)
+    op.execute("DELETE FROM protocols WHERE user_id IS NULL")
+
+    op.drop_index('ix_protocols_catalog_slug_version', table_name='protocols')
+    op.drop_constraint('ck_protocols_owner_or_catalog', 'protocols', type_='check')
+    op.drop_column('protocols', 'catalog_slug')
+    op.alter_column('protocols', 'user_id', existing_type=sa.Integer, nullable=False)
@@ -0,0 +1,197 @@
+"""
+Synthetic library generator for the benchmark suite.
+
+Builds users, protocols and encapsulation DAGs modelled on the catalog stacks in CATALOG_DIR (Ethernet II,
+IPv4, TCP, UDP, ICMP) directly in the configured database, using bulk inserts. Run it from backend/
+against a local, migrated Postgres:
+
+    python -m benchmarks.generate --users 1000 --protocols 50 --depth 6 --width 4 --fan-in 2
+
+Every generated user is called bench-<n>@example.com and has the password in BENCHMARK_PASSWORD.
+Previously generated users are removed first, nothing else in the database is touched.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import random
+import time
+import uuid
+
+from passlib.context import CryptContext
+from sqlalchemy import text
+
+from src.config import settings
+from src.crud.protocol_encapsulation_closure import rebuild_closure
+from src.database import SessionLocal
+from src.models import Protocol, ProtocolEncapsulation, ProtocolField, User
+from src.svg.metadata import parse_metadata
+
+BENCHMARK_PASSWORD = "benchmark-password"
+EMAIL_PATTERN = "bench-{}@example.com"
+
+# The catalog ships inside the backend, so seeds are also found in the Docker image
+SEEDS_DIR = settings.CATALOG_DIR
+
+# Layers of the seed stacks, lower layers encapsulate the ones above them
+LAYERS = [
+    ["Ethernet II"],
+    ["IPv4"],
+    ["TCP", "UDP", "ICMP Basic Header"],
+    ["ICMP Type 0 Header"],
+]
+
+
+def load_examples() -> dict:
+    """Fields of every seed protocol, keyed by protocol name."""
+    examples = {}
+
+    for path in glob.glob(os.path.join(SEEDS_DIR, "*", "*.svg")):
+        with open(path, "rb") as f:
+            metadata = parse_metadata(f.read())
+        examples[metadata["info"]["name"] or os.path.basename(path)] = metadata["fields"]
+
+    return examples
+
+
+def layer_names(depth: int, width: int) -> list[list[str]]:
+    """Stretch the example stack to depth layers of width protocols each, reusing example names."""
+    layers = []
+
+    for level in range(depth):
+        base = LAYERS[min(level, len(LAYERS) - 1)]
+        layers.append([f"{base[i % len(base)]} L{level} #{i}" for i in range(width)])
+
+    return layers
+
+
+def encapsulation_fields(parent_fields: list[dict]) -> str:
+    """The parent field an encapsulation is selected by, like the editor stores it."""
+    candidates = [field for field in parent_fields if field["field_options"]] or parent_fields[:1]
+
+    if not candidates:
+        return json.dumps([])
+
+    field = dict(random.choice(candidates))
+    field["field_options"] = [{**option, "used_for_encapsulation": True} for option in field["field_options"][:1]]
+
+    return json.dumps([field])
+
+
+def generate_user(user_id: int, args, examples: dict, now: datetime.datetime):
+    protocols = []
+    fields = []
+    encapsulations = []
+
+    example_names = list(examples)
+    remaining = args.protocols
+    stacks = []
+
+    # Each user gets as many full stacks as fit in their protocol budget
+    while remaining >= args.depth * args.width or not stacks:
+        layers = []
+
+        for names in layer_names(args.depth, args.width):
+            layer = []
+
+            for name in names:
+                protocol_id = uuid.uuid4()
+                base = next((example for example in example_names if name.startswith(example)), example_names[0])
+
+                protocols.append({
+                    "id": protocol_id, "user_id": user_id, "name": name, "author": "Benchmark",
+                    "version": "1.0", "description": f"Synthetic copy of {base}",
+                    "created_at": now, "updated_at": now,
+                })
+                fields.extend({
+                    "protocol_id": protocol_id, "field_id": field["id"], "user_id": user_id,
+                    "display_name": field["display_name"], "description": field["description"] or None,
+                } for field in {field["id"]: field for field in examples[base]}.values())
+
+                layer.append((protocol_id, base))
+
+            layers.append(layer)
+
+        stacks.append(layers)
+        remaining -= args.depth * args.width
+
+    for layers in stacks:
+        for lower, upper in zip(layers, layers[1:]):
+            for protocol_id, _ in upper:
+                for parent_id, parent_base in random.sample(lower, min(args.fan_in, len(lower))):
+                    encapsulations.append({
+                        "id": uuid.uuid4(), "protocol_id": protocol_id, "parent_protocol_id": parent_id,
+                        "fields": encapsulation_fields(examples[parent_base]),
+                        "created_at": now, "updated_at": now,
+                    })
+
+    return protocols, fields, encapsulations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--protocols", type=int, default=40, help="protocols per user, rounded down to whole stacks (at least one)")
+    parser.add_argument("--depth", type=int, default=4, help="layers per encapsulation stack")
+    parser.add_argument("--width", type=int, default=3, help="protocols per layer")
+    parser.add_argument("--fan-in", type=int, default=2, help="parents of each protocol in the layer below")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    examples = load_examples()
+
+    if not examples:
+        parser.error(f"no seed SVGs found in {os.path.abspath(SEEDS_DIR)}, run from backend/ or set CATALOG_DIR")
+
+    now = datetime.datetime.now()
+    # Hashing once keeps generation fast, every user shares the same bcrypt hash
+    password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(BENCHMARK_PASSWORD)
+
+    db = SessionLocal()
+    start = time.perf_counter()
+
+    try:
+        bench_users = db.query(User.id).filter(User.email.like(EMAIL_PATTERN.format("%")))
+        bench_protocols = db.query(Protocol.id).filter(Protocol.user_id.in_(bench_users))
+        db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.protocol_id.in_(bench_protocols)).delete(synchronize_session=False)
+        db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.parent_protocol_id.in_(bench_protocols)).delete(synchronize_session=False)
+        db.query(Protocol).filter(Protocol.user_id.in_(bench_users)).delete(synchronize_session=False)
+        db.query(User).filter(User.email.like(EMAIL_PATTERN.format("%"))).delete(synchronize_session=False)
+        db.commit()
+
+        totals = {"users": 0, "protocols": 0, "encapsulations": 0}
+
+        for n in range(args.users):
+            user_id = db.execute(
+                text("INSERT INTO users (email, name, password, created_at, updated_at) VALUES (:email, :name, :password, :now, :now) RETURNING id"),
+                {"email": EMAIL_PATTERN.format(n), "name": f"Benchmark {n}", "password": password, "now": now},
+            ).scalar_one()
+
+            protocols, fields, encapsulations = generate_user(user_id, args, examples, now)
+
+            db.execute(Protocol.__table__.insert(), protocols)
+            if fields:
+                db.execute(ProtocolField.__table__.insert(), fields)
+            if encapsulations:
+                db.execute(ProtocolEncapsulation.__table__.insert(), encapsulations)
+            db.commit()
+
+            totals["users"] += 1
+            totals["protocols"] += len(protocols)
+            totals["encapsulations"] += len(encapsulations)
+
+        # Only the closure rows of the generated protocols, other users' rows are left alone
+        rebuild_closure(db, bench_protocols)
+        db.execute(text("ANALYZE"))
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"Generated {totals['users']} users, {totals['protocols']} protocols and "
+          f"{totals['encapsulations']} encapsulations in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
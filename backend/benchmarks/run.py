@@ -0,0 +1,316 @@
+"""
+Load-testing and benchmark runner.
+
+Drives the API at a fixed concurrency, either in-process through httpx's ASGI transport or over HTTP
+against a running server, using the users created by benchmarks.generate. Run it from backend/:
+
+    python -m benchmarks.run --concurrency 16 --requests 500
+    python -m benchmarks.run --url http://localhost:8000 --scenarios read_protocols tree
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+Reports throughput, p50/p99 latency and, in-process only, SQL queries per request. With --baseline
+the exit code is 1 when a scenario regressed by more than --tolerance. The upload scenario writes to a
+scratch protocol per user, created for the run and deleted afterwards, the generated library is not changed.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import httpx
+from sqlalchemy import event, text
+
+from benchmarks.generate import BENCHMARK_PASSWORD, EMAIL_PATTERN, SEEDS_DIR
+from src.database import SessionLocal, engine
+
+# Counts SQL statements of the request running in the current task, in-process mode only
+_query_counter: ContextVar[Optional[list]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class BenchmarkSession:
+    """A logged in benchmark user and the protocols the scenarios work with."""
+
+    def __init__(self, email: str, cookies, protocol_id: str, leaf_id: str):
+        self.email = email
+        self.cookies = cookies
+        self.protocol_id = protocol_id
+        self.leaf_id = leaf_id
+        # Throwaway protocol the upload scenario writes to, so the generated library stays as it is
+        self.scratch_id = None
+
+
+def load_example_svgs() -> list[bytes]:
+    svgs = []
+    for path in glob.glob(os.path.join(SEEDS_DIR, "*", "*.svg")):
+        with open(path, "rb") as f:
+            svgs.append(f.read())
+    return svgs
+
+
+async def scenario_login(client, session, svgs):
+    return await client.post("/login", data={"username": session.email, "password": BENCHMARK_PASSWORD})
+
+
+async def scenario_read_protocols(client, session, svgs):
+    return await client.get("/protocols", cookies=session.cookies)
+
+
+async def scenario_breadcrumbs(client, session, svgs):
+    return await client.get(f"/protocol-encapsulations/{session.leaf_id}/breadcrumbs", cookies=session.cookies)
+
+
+async def scenario_tree(client, session, svgs):
+    return await client.get(f"/protocol-encapsulations/{session.leaf_id}/tree", cookies=session.cookies)
+
+
+async def scenario_search(client, session, svgs):
+    return await client.get("/search", params={"q": random.choice(["tcp", "checksum", "ipv4", "port", "ethrnet"])}, cookies=session.cookies)
+
+
+async def scenario_upload(client, session, svgs):
+    files = {"file": (f"{session.scratch_id}.svg", random.choice(svgs), "image/svg+xml")}
+    return await client.post(f"/protocols/{session.scratch_id}/upload", files=files, cookies=session.cookies)
+
+
+# Scenarios that write, they get a scratch protocol per session
+WRITING_SCENARIOS = {"upload"}
+
+
+async def create_scratch_protocols(client, sessions: list[BenchmarkSession]):
+    for session in sessions:
+        response = await client.post("/protocols", json={
+            "name": "Benchmark scratch", "author": "Benchmark", "version": "1.0",
+            "description": "Written to by the benchmark, deleted when it ends",
+        }, cookies=session.cookies)
+        response.raise_for_status()
+        session.scratch_id = response.json()["id"]
+
+
+async def delete_scratch_protocols(client, sessions: list[BenchmarkSession], in_process: bool):
+    for session in sessions:
+        if session.scratch_id is None:
+            continue
+
+        await client.delete(f"/protocols/{session.scratch_id}", cookies=session.cookies)
+
+        # Deleting a protocol keeps its SVGs, in-process the benchmark shares static/ and cleans up itself
+        if in_process:
+            for suffix in ["svg", "original.svg"]:
+                try:
+                    os.remove(f"static/{session.scratch_id}.{suffix}")
+                except FileNotFoundError:
+                    pass
+
+        session.scratch_id = None
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "read_protocols": scenario_read_protocols,
+    "breadcrumbs": scenario_breadcrumbs,
+    "tree": scenario_tree,
+    "search": scenario_search,
+    "upload": scenario_upload,
+}
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def pick_sessions(count: int) -> list[tuple[str, str, str]]:
+    """Benchmark users with the protocol that has the most ancestors, i.e. the top of their deepest stack."""
+    db = SessionLocal()
+
+    try:
+        # One pass over the picked users' protocols, ranked by id and by ancestor count
+        rows = db.execute(text("""
+            WITH picked AS (
+                SELECT id, email FROM users WHERE email LIKE :pattern ORDER BY id LIMIT :count
+            ), ranked AS (
+                SELECT p.user_id, p.id,
+                       row_number() OVER (PARTITION BY p.user_id ORDER BY p.id) AS by_id,
+                       row_number() OVER (PARTITION BY p.user_id ORDER BY count(c.ancestor_id) DESC, p.id) AS by_depth
+                FROM picked u
+                JOIN protocols p ON p.user_id = u.id
+                LEFT JOIN protocol_encapsulation_closure c ON c.descendant_id = p.id
+                GROUP BY p.user_id, p.id
+            )
+            SELECT u.email, first.id AS protocol_id, deepest.id AS leaf_id
+            FROM picked u
+            JOIN ranked first ON first.user_id = u.id AND first.by_id = 1
+            JOIN ranked deepest ON deepest.user_id = u.id AND deepest.by_depth = 1
+            ORDER BY u.id
+        """), {"pattern": EMAIL_PATTERN.format("%"), "count": count}).all()
+    finally:
+        db.close()
+
+    if not rows:
+        raise SystemExit("No benchmark users found, run python -m benchmarks.generate first")
+
+    return [(row.email, str(row.protocol_id), str(row.leaf_id)) for row in rows]
+
+
+async def login(client, email: str):
+    response = await client.post("/login", data={"username": email, "password": BENCHMARK_PASSWORD})
+    response.raise_for_status()
+    return response.cookies
+
+
+async def run_scenario(client, name: str, sessions: list[BenchmarkSession], svgs, requests: int, concurrency: int, in_process: bool) -> dict:
+    scenario = SCENARIOS[name]
+    latencies = []
+    queries = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+
+        while remaining > 0:
+            remaining -= 1
+            session = random.choice(sessions)
+            counter = [0]
+            token = _query_counter.set(counter) if in_process else None
+
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, session, svgs)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+            if token is not None:
+                _query_counter.reset(token)
+                queries.append(counter[0])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    regressed = False
+
+    print(f"\n{'scenario':<16}{'p50':>12}{'p99':>12}{'rps':>12}{'queries':>12}")
+
+    for name, result in results.items():
+        base = baseline.get(name)
+
+        if base is None:
+            print(f"{name:<16}{'(no baseline)':>48}")
+            continue
+
+        def delta(key):
+            if result.get(key) is None or not base.get(key):
+                return None
+            return (result[key] - base[key]) / base[key]
+
+        deltas = {key: delta(key) for key in ["p50_ms", "p99_ms", "throughput_rps", "queries_per_request"]}
+        failed = (
+            (deltas["p99_ms"] or 0) > tolerance
+            or (deltas["throughput_rps"] or 0) < -tolerance
+            or (deltas["queries_per_request"] or 0) > 0
+        )
+        regressed = regressed or failed
+
+        cells = "".join(f"{'n/a' if d is None else f'{d:+.1%}':>12}" for d in deltas.values())
+        print(f"{name:<16}{cells}{'  REGRESSION' if failed else ''}")
+
+    return regressed
+
+
+async def main_async(args) -> dict:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from src.__main__ import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+    async with client:
+        sessions = [
+            BenchmarkSession(email, await login(client, email), protocol_id, leaf_id)
+            for email, protocol_id, leaf_id in pick_sessions(args.sessions)
+        ]
+        svgs = load_example_svgs()
+
+        results = {}
+
+        if WRITING_SCENARIOS & set(args.scenarios):
+            await create_scratch_protocols(client, sessions)
+
+        try:
+            for name in args.scenarios:
+                # A short warm-up so connection pools and caches don't count against the first scenario
+                await run_scenario(client, name, sessions, svgs, min(args.concurrency * 2, args.requests), args.concurrency, not args.url)
+                results[name] = await run_scenario(client, name, sessions, svgs, args.requests, args.concurrency, not args.url)
+
+                result = results[name]
+                print(f"{name:<16} {result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+                      f"p99 {result['p99_ms']:>8.2f} ms  queries/request {result['queries_per_request'] if result['queries_per_request'] is not None else 'n/a'}  "
+                      f"errors {result['errors']}")
+        finally:
+            await delete_scratch_protocols(client, sessions, not args.url)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=20, help="benchmark users to spread requests over")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99/throughput change before failing")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = asyncio.run(main_async(args))
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
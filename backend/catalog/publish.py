@@ -0,0 +1,35 @@
+"""
+Publish the shared protocol catalog described in catalog.json to the configured database.
+
+Catalog protocols are owned by no user, every user can read them and encapsulate their own protocols in
+them. Published versions are immutable: this only adds versions and encapsulations that are not in the
+database yet, so it is safe to run on every start. Run it from backend/ after migrating:
+
+    python -m catalog.publish
+
+To change a catalog protocol, add its new SVG under a new version in the SVG metadata and list it in
+catalog.json next to the old one.
+"""
+import argparse
+
+from src.crud.catalog import publish_catalog
+from src.database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-dir", default=None, help="directory with catalog.json, defaults to CATALOG_DIR")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+
+    try:
+        summary = publish_catalog(db, args.catalog_dir)
+    finally:
+        db.close()
+
+    print(f"Published {summary['protocols']} catalog protocols and {summary['encapsulations']} encapsulations")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, HTTPException
 
 from src.router import router
+from src.changefeed import change_feed
+from src.profiling import ProfilingMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import PlainTextResponse
@@ -12,6 +14,8 @@ app.include_router(router)
 
 origins = ["http://localhost:3000", "http://localhost:80", "http://localhost", "localhost", "http://localhost:8080", "http://147.175.151.135", "https://protocol-designer.app:8000", "protocol-designer.app:8000", "http://protocol-designer.app:8000", "https://protocol-designer.app"]
 
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -22,6 +26,14 @@ app.add_middleware(
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@app.on_event("startup")
+async def start_change_feed():
+    change_feed.start()
+
+@app.on_event("shutdown")
+async def stop_change_feed():
+    change_feed.stop()
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     return PlainTextResponse(str(exc), status_code=400)
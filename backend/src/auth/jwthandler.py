@@ -96,3 +96,28 @@ async def get_current_user(token: str = Depends(security), db: Session = Depends
 
 
     return user
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user or not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return current_user
+
+
+def get_user_from_authorization(authorization: Optional[str], db: Session) -> Optional[User]:
+    """Resolve the Authorization cookie outside of a route, returns None instead of raising."""
+    scheme, token = get_authorization_scheme_param(authorization)
+
+    if not authorization or scheme.lower() != "bearer":
+        return None
+
+    try:
+        email = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+    if email is None:
+        return None
+
+    return db.query(User).where(User.email == email).first()
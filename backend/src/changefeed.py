@@ -0,0 +1,151 @@
+import asyncio
+import json
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from src.crud.changes import CHANNEL
+from src.database import DATABASE_URL
+
+RECONNECT_DELAY = 5
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when changes were lost, dropped on a full queue or sent while the feed was reconnecting,
+        # the stream then catches up from the log
+        self.missed = False
+
+    def push(self, change: dict):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.missed = True
+
+
+class ChangeFeed:
+    """Fans Postgres NOTIFY messages out to the change feed subscribers of this process."""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.connection = None
+        self.connecting = None
+        self.loop = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscriptions.get(subscription.user_id)
+
+        if subscriptions is None:
+            return
+
+        subscriptions.discard(subscription)
+
+        if not subscriptions:
+            del self.subscriptions[subscription.user_id]
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._schedule_connect()
+
+    def stop(self):
+        if self.connecting is not None:
+            self.connecting.cancel()
+            self.connecting = None
+
+        self._disconnect()
+
+    def _schedule_connect(self):
+        self.connecting = self.loop.create_task(self._connect())
+
+    @staticmethod
+    def _listen():
+        connection = psycopg2.connect(DATABASE_URL)
+
+        try:
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            connection.cursor().execute(f"LISTEN {CHANNEL}")
+        except psycopg2.Error:
+            connection.close()
+            raise
+
+        return connection
+
+    async def _connect(self):
+        # Connecting blocks until the server answers, keep it off the event loop
+        try:
+            connection = await self.loop.run_in_executor(None, self._listen)
+        except psycopg2.Error as e:
+            print(f"Change feed could not connect: {e}")
+            self.connecting = None
+            self.loop.call_later(RECONNECT_DELAY, self._schedule_connect)
+            return
+
+        self.connecting = None
+        self.connection = connection
+
+        # The LISTEN connection is polled from the event loop, no extra thread needed
+        self.loop.add_reader(self.connection.fileno(), self._on_readable)
+
+        # Nothing was heard while disconnected
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                subscription.missed = True
+
+    def _disconnect(self):
+        if self.connection is None:
+            return
+
+        try:
+            self.loop.remove_reader(self.connection.fileno())
+        except (ValueError, psycopg2.Error):
+            pass
+
+        self.connection.close()
+        self.connection = None
+
+    def _on_readable(self):
+        try:
+            self.connection.poll()
+        except psycopg2.Error as e:
+            print(f"Change feed lost its connection: {e}")
+            self._disconnect()
+            self.loop.call_later(RECONNECT_DELAY, self._schedule_connect)
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            change = json.loads(notify.payload)
+
+            for subscription in self.subscriptions.get(change["user_id"], ()):
+                subscription.push(change)
+
+
+def coalesce(changes: list[dict]) -> list[dict]:
+    """Collapse a burst of changes to the latest change per protocol or encapsulation, in sequence order."""
+    latest = {}
+
+    for change in changes:
+        if change["kind"] == "encapsulation_changed":
+            key = ("encapsulation", change["encapsulation_id"])
+        else:
+            key = ("protocol", change["protocol_id"])
+
+        # A protocol created and changed within the same burst is still new to the client
+        if key in latest and latest[key]["kind"] == "created" and change["kind"] == "updated":
+            change = {**change, "kind": "created"}
+
+        latest[key] = change
+
+    return sorted(latest.values(), key=lambda change: change["seq"])
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,294 @@
+from src.codegen.model import identifier, payload_field, unique
+
+HELPERS = """\
+#ifndef PD_BIT_HELPERS
+#define PD_BIT_HELPERS
+
+/* Read count (at most 64) bits starting at bit, most significant bit first */
+static inline uint64_t pd_read_bits(const uint8_t *buf, size_t bit, unsigned count)
+{
+    uint64_t value = 0;
+
+    while (count > 0) {
+        unsigned shift = bit % 8;
+        unsigned take = 8 - shift < count ? 8 - shift : count;
+
+        value = (value << take) | ((buf[bit / 8] >> (8 - shift - take)) & ((1u << take) - 1));
+        bit += take;
+        count -= take;
+    }
+
+    return value;
+}
+
+/* Little endian variant of pd_read_bits, count must be a multiple of 8 */
+static inline uint64_t pd_read_bits_le(const uint8_t *buf, size_t bit, unsigned count)
+{
+    uint64_t value = 0;
+
+    for (unsigned i = 0; i < count / 8; i++)
+        value |= pd_read_bits(buf, bit + i * 8, 8) << (i * 8);
+
+    return value;
+}
+
+/* Copy count bits into whole bytes, a trailing partial byte keeps its bits in the low end */
+static inline void pd_copy_bits(uint8_t *dst, const uint8_t *buf, size_t bit, size_t count)
+{
+    for (size_t i = 0; i * 8 < count; i++)
+        dst[i] = (uint8_t)pd_read_bits(buf, bit + i * 8, count - i * 8 < 8 ? (unsigned)(count - i * 8) : 8);
+}
+
+#endif
+
+"""
+
+
+def _comment(text: str) -> str:
+    return " ".join(str(text).replace("*/", "* /").split())
+
+
+def _c_type(bits: int) -> str:
+    for width in (8, 16, 32, 64):
+        if bits <= width:
+            return f"uint{width}_t"
+
+
+def _is_array(field: dict) -> bool:
+    return not field["variable"] and field["bits"] > 64
+
+
+def _constants(layer: dict, taken: set) -> str:
+    lines = []
+
+    for field in layer["fields"]:
+        for option in field.get("field_options") or []:
+            name = unique(f"{layer['name']}_{field['name']}_{identifier(option['name'])}".upper(), taken)
+            lines.append(f"#define {name} 0x{option['value']:X}u /* {_comment(option['name'])} */")
+
+    return "\n".join(lines) + "\n\n" if lines else ""
+
+
+def _struct(layer: dict) -> str:
+    payload = payload_field(layer)
+    lines = [f"/* {_comment(layer['display_name'])}{' - ' + _comment(layer['description']) if layer['description'] else ''} */", "typedef struct {"]
+
+    for field in layer["fields"]:
+        if field is payload:
+            continue
+
+        label = _comment(field["display_name"])
+
+        if field["variable"]:
+            limit = f", up to {field['max_bits']} bits" if field["greedy"] and field["max_bits"] else f", {field['bits']} bits"
+            lines.append(f"    const uint8_t *{field['name']}; /* {label}, variable length{limit} */")
+            lines.append(f"    size_t {field['name']}_len; /* in bytes */")
+        elif _is_array(field):
+            lines.append(f"    uint8_t {field['name']}[{(field['bits'] + 7) // 8}]; /* {label}, {field['bits']} bits */")
+        elif field["bits"]:
+            lines.append(f"    {_c_type(field['bits'])} {field['name']}; /* {label}, {field['bits']} bits */")
+
+    lines.append("    const uint8_t *payload; /* " + (f"{_comment(payload['display_name'])}" if payload else "Data following the header") + " */")
+    lines.append("    size_t payload_len;")
+    lines.append(f"}} {layer['name']}_t;")
+
+    return "\n".join(lines) + "\n\n"
+
+
+def _parse_variable(target: str, length_target: str, field: dict) -> list[str]:
+    # Variable length data starts on the next byte boundary
+    if not field["greedy"]:
+        return [
+            "    bit = (bit + 7) / 8 * 8;",
+            f"    if (bits < bit + {field['bits']})",
+            "        return -1;",
+            f"    {target} = buf + bit / 8;",
+            f"    {length_target} = {field['bits'] // 8};",
+            f"    bit += {field['bits']};",
+        ]
+
+    lines = [
+        "    bit = (bit + 7) / 8 * 8;",
+        f"    if (bits < bit + {field['trailer_bits']})",
+        "        return -1;",
+        f"    n = bits - bit - {field['trailer_bits']};",
+    ]
+    if field["max_bits"]:
+        lines += [f"    if (n > {field['max_bits']})", f"        n = {field['max_bits']};"]
+    lines += [
+        "    n -= n % 8;",
+        f"    {target} = buf + bit / 8;",
+        f"    {length_target} = n / 8;",
+        "    bit += n;",
+    ]
+    return lines
+
+
+def _parse_fixed(target: str, field: dict) -> list[str]:
+    bits = field["bits"]
+    lines = [f"    if (bits - bit < {bits})", "        return -1;"]
+
+    if _is_array(field):
+        lines.append(f"    pd_copy_bits({target}, buf, bit, {bits});")
+    elif field.get("endian") == "little" and bits % 8 == 0:
+        lines.append(f"    {target} = ({_c_type(bits)})pd_read_bits_le(buf, bit, {bits});")
+    else:
+        lines.append(f"    {target} = ({_c_type(bits)})pd_read_bits(buf, bit, {bits});")
+
+    lines.append(f"    bit += {bits};")
+    return lines
+
+
+def _parser(layer: dict) -> str:
+    payload = payload_field(layer)
+    lines = [
+        f"/* Parse a {_comment(layer['display_name'])} header, returns the number of bytes consumed or -1 if buf is too short */",
+        f"static inline long {layer['name']}_parse(const uint8_t *buf, size_t len, {layer['name']}_t *out)",
+        "{",
+        "    size_t bits = len * 8;",
+        "    size_t bit = 0;",
+    ]
+
+    if any(field["variable"] for field in layer["fields"]):
+        lines.append("    size_t n;")
+
+    for field in layer["fields"]:
+        lines.append("")
+        lines.append(f"    /* {_comment(field['display_name'])} */")
+
+        if field is payload:
+            if field["variable"]:
+                lines += _parse_variable("out->payload", "out->payload_len", field)
+            else:
+                lines += [
+                    "    bit = (bit + 7) / 8 * 8;",
+                    f"    if (bits < bit + {field['bits']})",
+                    "        return -1;",
+                    "    out->payload = buf + bit / 8;",
+                    f"    out->payload_len = {(field['bits'] + 7) // 8};",
+                    f"    bit += {field['bits']};",
+                ]
+        elif field["variable"]:
+            lines += _parse_variable(f"out->{field['name']}", f"out->{field['name']}_len", field)
+        elif field["bits"]:
+            lines += _parse_fixed(f"out->{field['name']}", field)
+
+    if payload is None:
+        lines += ["", "    out->payload = buf + (bit + 7) / 8;", "    out->payload_len = len - (bit + 7) / 8;"]
+
+    lines += ["", "    return (long)((bit + 7) / 8);", "}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _dispatcher(layer: dict, stack: str) -> str:
+    if not layer["children"]:
+        return ""
+
+    lines = [
+        f"/* The layer carried in the payload of a {_comment(layer['display_name'])} header */",
+        f"static inline enum {stack}_layer {layer['name']}_next(const {layer['name']}_t *header)",
+        "{",
+    ]
+    fallback = None
+
+    for child in layer["children"]:
+        constant = f"{stack}_{child['layer']['name']}".upper()
+
+        if not child["selectors"]:
+            # Encapsulations without selected options match anything the other children don't
+            fallback = fallback or constant
+            continue
+
+        conditions = " || ".join(
+            f"header->{field['name']} == 0x{value:X}u"
+            for field, values in child["selectors"]
+            for value in values
+        )
+        lines += [f"    if ({conditions})", f"        return {constant};"]
+
+    lines += [f"    return {fallback or stack.upper() + '_NONE'};", "}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _stack_parser(layers: list[dict], stack: str) -> str:
+    lines = [
+        "typedef struct {",
+        f"    enum {stack}_layer layer;",
+        "    union {",
+        *[f"        {layer['name']}_t {layer['name']};" for layer in layers],
+        "    } header;",
+        f"}} {stack}_layer_t;",
+        "",
+        "/*",
+        " * Parse buf starting with the first layer and following the encapsulations up the stack.",
+        " * Returns the number of layers filled in, parsing stops at the first header that doesn't fit.",
+        " */",
+        f"static inline size_t {stack}_parse(const uint8_t *buf, size_t len, enum {stack}_layer first, {stack}_layer_t *layers, size_t max_layers)",
+        "{",
+        f"    enum {stack}_layer next = first;",
+        "    size_t count = 0;",
+        "",
+        f"    while (next != {stack.upper()}_NONE && count < max_layers) {{",
+        f"        {stack}_layer_t *layer = &layers[count];",
+        "",
+        "        layer->layer = next;",
+        "",
+        "        switch (next) {",
+    ]
+
+    for layer in layers:
+        header = f"layer->header.{layer['name']}"
+        lines += [
+            f"        case {stack.upper()}_{layer['name'].upper()}:",
+            f"            if ({layer['name']}_parse(buf, len, &{header}) < 0)",
+            "                return count;",
+            f"            buf = {header}.payload;",
+            f"            len = {header}.payload_len;",
+            f"            next = {layer['name']}_next(&{header});" if layer["children"] else f"            next = {stack.upper()}_NONE;",
+            "            break;",
+        ]
+
+    lines += [
+        "        default:",
+        "            return count;",
+        "        }",
+        "",
+        "        count++;",
+        "    }",
+        "",
+        "    return count;",
+        "}",
+    ]
+    return "\n".join(lines) + "\n\n"
+
+
+def generate_c(layers: list[dict], target: dict, version: int) -> str:
+    """A single header with a struct, a parser and the option constants for every layer of the stack."""
+    stack = f"{target['name']}_stack"
+    guard = f"PD_{stack.upper()}_H"
+    taken = set()
+
+    content = "/*\n"
+    content += f" * {_comment(target['display_name'])} protocol stack\n"
+    content += f" * Generated by Protocol Designer, code generator version {version}\n"
+    content += " *\n"
+    content += f" * Layers: {', '.join(_comment(layer['display_name']) for layer in layers)}\n"
+    content += " * Headers generated for different stacks share type names, include one per translation unit.\n"
+    content += " */\n"
+    content += f"#ifndef {guard}\n#define {guard}\n\n#include <stddef.h>\n#include <stdint.h>\n\n"
+    content += HELPERS
+
+    content += f"enum {stack}_layer {{\n    {stack.upper()}_NONE = 0,\n"
+    content += "".join(f"    {stack.upper()}_{layer['name'].upper()},\n" for layer in layers)
+    content += "};\n\n"
+
+    for layer in layers:
+        content += _constants(layer, taken)
+        content += _struct(layer)
+        content += _parser(layer)
+        content += _dispatcher(layer, stack)
+
+    content += _stack_parser(layers, stack)
+    content += f"#endif /* {guard} */\n"
+
+    return content
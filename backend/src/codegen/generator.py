@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import settings
+from src.codegen.c import generate_c
+from src.codegen.lua import generate_lua
+from src.codegen.model import build_stack
+from src.file_cache import prune_cache_dir, touch_cached
+from src.svg.metadata import parse_metadata
+from src.svg.pool import run_in_pool
+
+# Bump whenever the generated code changes, so stale cache entries are not served
+GENERATOR_VERSION = 1
+
+TARGETS = {
+    "c": {"suffix": "h", "media_type": "text/x-c"},
+    "lua": {"suffix": "lua", "media_type": "text/x-lua"},
+}
+
+PROTOCOL_KEYS = ["id", "name", "description", "version"]
+
+
+def generate_code(target: str, protocol_id: str, protocols: list[dict], encapsulations: list[dict], options: dict) -> bytes:
+    """Parse the SVG of every protocol in the stack and generate code for it. Runs in the process pool."""
+    definitions = [
+        {**{key: protocol[key] for key in PROTOCOL_KEYS}, "fields": parse_metadata(protocol["svg"])["fields"] if protocol["svg"] else []}
+        for protocol in protocols
+    ]
+
+    layers = build_stack(definitions, encapsulations)
+    target_layer = next(layer for layer in layers if layer["id"] == protocol_id)
+
+    if target == "c":
+        return generate_c(layers, target_layer, GENERATOR_VERSION).encode()
+
+    return generate_lua(layers, target_layer, GENERATOR_VERSION, udp_port=options.get("udp_port")).encode()
+
+
+def code_cache_key(target: str, protocol_id: str, protocols: list[dict], encapsulations: list[dict], options: dict) -> str:
+    """Content address of an artifact, the SVGs are hashed instead of parsed so a cache hit stays cheap."""
+    payload = json.dumps(
+        {
+            "version": GENERATOR_VERSION,
+            "target": target,
+            "protocol_id": protocol_id,
+            "options": options,
+            "protocols": [
+                {**{key: protocol[key] for key in PROTOCOL_KEYS}, "svg": hashlib.sha256(protocol["svg"]).hexdigest() if protocol["svg"] else None}
+                for protocol in protocols
+            ],
+            "encapsulations": encapsulations,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def code_cache_path(key: str, target: str) -> str:
+    return os.path.join(settings.CODEGEN_CACHE_DIR, f"{key}.{TARGETS[target]['suffix']}")
+
+
+def prune_code_cache(max_bytes: int):
+    """Remove the least recently used artifacts until the cache fits in max_bytes."""
+    prune_cache_dir(settings.CODEGEN_CACHE_DIR, max_bytes)
+
+
+_last_prune = 0.0
+
+
+async def _maybe_prune():
+    global _last_prune
+
+    if time.monotonic() - _last_prune < settings.CODEGEN_CACHE_PRUNE_INTERVAL:
+        return
+
+    _last_prune = time.monotonic()
+    await run_in_threadpool(prune_code_cache, settings.CODEGEN_CACHE_MAX_BYTES)
+
+
+async def generate_code_cached(target: str, protocol_id: str, protocols: list[dict], encapsulations: list[dict], options: dict) -> str:
+    """Return the path of the generated artifact, generating it only on a cache miss."""
+    path = code_cache_path(code_cache_key(target, protocol_id, protocols, encapsulations, options), target)
+
+    if touch_cached(path):
+        return path
+
+    generated = await run_in_pool(generate_code, target, protocol_id, protocols, encapsulations, options)
+
+    os.makedirs(settings.CODEGEN_CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary file first so concurrent readers never see a partial artifact
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(generated)
+    os.replace(tmp_path, path)
+
+    await _maybe_prune()
+
+    return path
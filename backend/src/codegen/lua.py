@@ -0,0 +1,280 @@
+from src.codegen.model import payload_field
+
+# DissectorTable.new only takes integer types up to 32 bits
+TABLE_TYPES = {1: "ftypes.UINT8", 2: "ftypes.UINT16", 3: "ftypes.UINT24", 4: "ftypes.UINT32"}
+UINT_TYPES = {1: "uint8", 2: "uint16", 3: "uint24", 4: "uint32"}
+
+
+def _string(text) -> str:
+    escaped = str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\r", " ").replace("\n", " ")
+    return f'"{escaped}"'
+
+
+def _comment(text) -> str:
+    return " ".join(str(text).split())
+
+
+def _proto(layer: dict) -> str:
+    return f"{layer['name']}_proto"
+
+
+def _abbrev(layer: dict) -> str:
+    # Prefixed so the generated protocols don't clash with Wireshark's own tcp, udp, ...
+    return f"pd_{layer['name']}"
+
+
+def _place_fields(layer: dict) -> list[dict]:
+    """
+    Work out where every field sits relative to a byte boundary. Variable length fields consume whole bytes,
+    so the bit phase of every fixed field is known when the dissector is generated.
+    """
+    phase = 0
+    placed = []
+
+    for field in layer["fields"]:
+        if field["variable"] or field.get("encapsulate"):
+            if phase:
+                placed.append({"align": True})
+                phase = 0
+            placed.append({"field": field})
+            continue
+
+        if not field["bits"]:
+            continue
+
+        size = (phase + field["bits"] + 7) // 8
+        aligned = phase == 0 and field["bits"] % 8 == 0
+
+        if size in UINT_TYPES:
+            kind = UINT_TYPES[size]
+            mask = None if aligned else ((1 << field["bits"]) - 1) << (size * 8 - phase - field["bits"])
+        elif size <= 8 and aligned:
+            kind, mask = "uint64", None
+        else:
+            kind, mask = "bytes", None
+
+        placed.append({
+            "field": field,
+            "phase": phase,
+            "size": size,
+            "kind": kind,
+            "mask": mask,
+            "advance": (phase + field["bits"]) // 8,
+        })
+        phase = (phase + field["bits"]) % 8
+
+    return placed
+
+
+def _selector_fields(layer: dict) -> list[dict]:
+    """Fields of this layer that children are selected by, in field order."""
+    names = {field["name"] for child in layer["children"] for field, _ in child["selectors"]}
+    return [field for field in layer["fields"] if field["name"] in names]
+
+
+def _table(layer: dict, field: dict) -> str:
+    return f"{layer['name']}_{field['name']}_table"
+
+
+def _field_definitions(layer: dict, placed: list[dict]) -> str:
+    fields = f"{layer['name']}_fields"
+    content = f"local {fields} = {{}}\n"
+
+    for entry in placed:
+        field = entry.get("field")
+
+        if field is None or field.get("encapsulate"):
+            continue
+
+        kind = entry.get("kind", "bytes")
+        values = "nil"
+
+        if field.get("field_options") and kind != "bytes":
+            values = f"{layer['name']}_{field['name']}_values"
+            content += f"local {values} = {{\n"
+            content += "".join(f"    [{option['value']}] = {_string(option['name'])},\n" for option in field["field_options"])
+            content += "}\n"
+
+        abbrev = _string(_abbrev(layer) + "." + field["name"])
+        description = _string(field["description"]) if field.get("description") else "nil"
+
+        if kind == "bytes":
+            content += f"{fields}.{field['name']} = ProtoField.bytes({abbrev}, {_string(field['display_name'])}, base.NONE, {description})\n"
+        else:
+            mask = f"0x{entry['mask']:X}" if entry["mask"] is not None else "nil"
+            content += (
+                f"{fields}.{field['name']} = ProtoField.{kind}({abbrev}, {_string(field['display_name'])}, "
+                f"base.HEX, {values}, {mask}, {description})\n"
+            )
+
+    content += f"{_proto(layer)}.fields = {fields}\n\n"
+
+    for field in _selector_fields(layer):
+        size = (field["bits"] + 7) // 8
+        if size in TABLE_TYPES:
+            content += (
+                f"local {_table(layer, field)} = DissectorTable.new({_string(_abbrev(layer) + '.' + field['name'])}, "
+                f"{_string(layer['display_name'] + ' ' + field['display_name'])}, {TABLE_TYPES[size]}, base.HEX, {_proto(layer)})\n"
+            )
+
+    return content
+
+
+def _dissector(layer: dict, placed: list[dict]) -> str:
+    fields = f"{layer['name']}_fields"
+    selectors = {field["name"] for field in _selector_fields(layer)}
+    payload = payload_field(layer)
+
+    content = f"function {_proto(layer)}.dissector(buffer, pinfo, tree)\n"
+    content += "    local length = buffer:len()\n"
+    content += "    if length == 0 then return 0 end\n\n"
+    content += f"    pinfo.cols.protocol = {_string(layer['display_name'])}\n"
+    content += f"    local subtree = tree:add({_proto(layer)}, buffer(), {_string(layer['display_name'])})\n\n"
+    content += "    local offset = 0\n"
+    content += "    local payload_offset = nil\n"
+    content += "    local payload_length = 0\n"
+    content += "".join(f"    local {name}_value = nil\n" for name in sorted(selectors))
+
+    for entry in placed:
+        if entry.get("align"):
+            content += "\n    -- Variable length data starts on the next byte boundary\n"
+            content += "    offset = offset + 1\n"
+            continue
+
+        field = entry["field"]
+        content += f"\n    -- {_comment(field['display_name'])}\n"
+
+        if field["variable"] or field is payload:
+            trailer = (field["trailer_bits"] + 7) // 8
+            variable = f"{field['name']}_length"
+
+            if field["greedy"]:
+                content += f"    local {variable} = length - offset - {trailer}\n"
+                content += f"    if {variable} < 0 then return offset end\n"
+                if field["max_bits"]:
+                    content += f"    if {variable} > {field['max_bits'] // 8} then {variable} = {field['max_bits'] // 8} end\n"
+            else:
+                content += f"    local {variable} = {(field['bits'] + 7) // 8}\n"
+                content += f"    if offset + {variable} > length then return offset end\n"
+
+            if field is payload:
+                content += "    payload_offset = offset\n"
+                content += f"    payload_length = {variable}\n"
+            else:
+                content += f"    if {variable} > 0 then subtree:add({fields}.{field['name']}, buffer(offset, {variable})) end\n"
+
+            content += f"    offset = offset + {variable}\n"
+            continue
+
+        add = "add_le" if field.get("endian") == "little" and entry["kind"] != "bytes" and entry["mask"] is None else "add"
+        content += f"    if offset + {entry['size']} > length then return offset end\n"
+        content += f"    subtree:{add}({fields}.{field['name']}, buffer(offset, {entry['size']}))\n"
+
+        if field["name"] in selectors or (field.get("field_options") and entry["kind"] != "bytes"):
+            content += f"    local {field['name']}_field_value = buffer(offset, {entry['size']}):bitfield({entry['phase']}, {field['bits']})\n"
+
+            if field["name"] in selectors:
+                content += f"    {field['name']}_value = {field['name']}_field_value\n"
+
+            for i, option in enumerate(field.get("field_options") or []):
+                content += f"    {'if' if i == 0 else 'elseif'} {field['name']}_field_value == {option['value']} then\n"
+                content += f"        pinfo.cols.info:append({_string(' [' + str(option['name']) + ']')})\n"
+            if field.get("field_options"):
+                content += "    end\n"
+
+        if entry["advance"]:
+            content += f"    offset = offset + {entry['advance']}\n"
+
+    if layer["children"]:
+        content += "\n    if payload_offset == nil then\n"
+        content += "        payload_offset = offset\n"
+        content += "        payload_length = length - offset\n"
+        content += "    end\n"
+        content += "\n    if payload_length > 0 then\n"
+        content += "        local payload = buffer(payload_offset, payload_length):tvb()\n"
+        content += "        local next_dissector = nil\n"
+
+        for field in _selector_fields(layer):
+            if (field["bits"] + 7) // 8 in TABLE_TYPES:
+                content += f"        if next_dissector == nil and {field['name']}_value ~= nil then\n"
+                content += f"            next_dissector = {_table(layer, field)}:get_dissector({field['name']}_value)\n"
+                content += "        end\n"
+
+        fallback = next((child["layer"] for child in layer["children"] if not child["selectors"]), None)
+        if fallback is not None:
+            content += f"        if next_dissector == nil then next_dissector = Dissector.get({_string(_abbrev(fallback))}) end\n"
+
+        content += "        if next_dissector == nil then next_dissector = data_dissector end\n"
+        content += "        next_dissector:call(payload, pinfo, tree)\n"
+        content += "    end\n"
+
+    content += "\n    return length\n"
+    content += "end\n\n"
+
+    return content
+
+
+def _child_registration(layer: dict) -> str:
+    content = ""
+
+    for parent in layer["parents"]:
+        for child in parent["children"]:
+            if child["layer"] is not layer:
+                continue
+
+            for field, values in child["selectors"]:
+                if (field["bits"] + 7) // 8 not in TABLE_TYPES:
+                    continue
+                for value in values:
+                    content += f"DissectorTable.get({_string(_abbrev(parent) + '.' + field['name'])}):add({value}, {_proto(layer)})\n"
+
+    return content + "\n" if content else ""
+
+
+def _root_registration(layer: dict, udp_port) -> str:
+    proto = _proto(layer)
+
+    if udp_port:
+        return (
+            f"-- Register {_comment(layer['display_name'])} for UDP port {udp_port}\n"
+            f"DissectorTable.get(\"udp.port\"):add({udp_port}, {proto})\n\n"
+        )
+
+    return (
+        f"-- {_comment(layer['display_name'])} is the lowest layer of the stack, register it where it is carried:\n"
+        f"-- DissectorTable.get(\"udp.port\"):add(12345, {proto})\n"
+        f"-- DissectorTable.get(\"tcp.port\"):add(54321, {proto})\n"
+        f"-- DissectorTable.get(\"ethertype\"):add(0x1234, {proto})\n"
+        f"-- DissectorTable.get(\"wtap_encap\"):add(wtap.USER0, {proto})\n\n"
+    )
+
+
+def generate_lua(layers: list[dict], target: dict, version: int, udp_port=None) -> str:
+    """One Lua plugin with a dissector per layer, chained through DissectorTables on the selector fields."""
+    content = f"-- {_comment(target['display_name'])} Wireshark Dissector\n"
+    content += f"-- Generated by Protocol Designer, code generator version {version}\n"
+    content += f"-- {_comment(target['description']) or 'No description provided'}\n"
+    content += f"-- Layers: {', '.join(_comment(layer['display_name']) for layer in layers)}\n"
+    content += "--\n"
+    content += "-- Usage: Place this file in Wireshark's plugins directory\n"
+    content += "-- Typically: ~/.local/lib/wireshark/plugins/ (Linux) or %APPDATA%\\Wireshark\\plugins (Windows)\n\n"
+    content += "local data_dissector = Dissector.get(\"data\")\n\n"
+
+    for layer in layers:
+        content += f"-- {_comment(layer['display_name'])}" + (f": {_comment(layer['description'])}" if layer["description"] else "") + "\n"
+        content += f"local {_proto(layer)} = Proto({_string(_abbrev(layer))}, {_string(layer['display_name'] + ' Protocol')})\n"
+        content += "\n"
+
+    for layer in layers:
+        placed = _place_fields(layer)
+        content += _field_definitions(layer, placed)
+        content += _dissector(layer, placed)
+
+    content += "-- Register protocols with Wireshark\n"
+
+    for layer in layers:
+        content += _child_registration(layer) if layer["parents"] else _root_registration(layer, udp_port)
+
+    content += f"print({_string(target['display_name'] + ' dissector loaded')})\n"
+
+    return content
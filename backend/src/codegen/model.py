@@ -0,0 +1,152 @@
+import re
+
+# Selectors are compared as integers, wider fields can't be matched in a single comparison
+MAX_SELECTOR_BITS = 64
+
+
+def identifier(name: str) -> str:
+    """Lowercase C and Lua identifier, like sanitizeFieldName() in the frontend export handlers."""
+    sanitized = re.sub(r"[^a-zA-Z0-9_]", "_", name.strip()).lower() or "_"
+    return sanitized if re.match(r"[a-zA-Z_]", sanitized) else f"_{sanitized}"
+
+
+def unique(name: str, taken: set) -> str:
+    candidate = name
+    n = 2
+
+    while candidate in taken:
+        candidate = f"{name}_{n}"
+        n += 1
+
+    taken.add(candidate)
+    return candidate
+
+
+def field_bits(field: dict, key: str = "length") -> int:
+    value = field.get(key) or 0
+    return value * 8 if field.get("length_unit") == "bytes" else value
+
+
+def _layout(fields: list[dict]) -> list[dict]:
+    """
+    Annotate fields with what the generators need: an identifier, the bit length, and for the variable length
+    field sized from the packet the number of bits that follow it, which the rest of the packet must leave room for.
+
+    Fields carry no reference to a length field, so only one variable length field per protocol can take what
+    is left of the packet: the encapsulated payload, or the last variable length field if there is none. Other
+    variable length fields take their nominal length. Variable length fields always consume whole bytes.
+    """
+    taken = {"payload", "payload_len"}
+    layout = []
+
+    for field in fields:
+        variable = bool(field.get("is_variable_length"))
+        bits = field_bits(field)
+
+        layout.append({
+            **field,
+            "name": unique(identifier(field["id"] or field["display_name"]), taken),
+            "bits": (bits + 7) // 8 * 8 if variable else bits,
+            "max_bits": field_bits(field, "max_length") // 8 * 8 if variable else bits,
+            "variable": variable,
+            "greedy": False,
+        })
+
+    variable = [field for field in layout if field["variable"]]
+    greedy = next((field for field in variable if field.get("encapsulate")), variable[-1] if variable else None)
+    if greedy is not None:
+        greedy["greedy"] = True
+
+    trailer = 0
+    for field in reversed(layout):
+        field["trailer_bits"] = trailer
+        if not field["greedy"]:
+            trailer += field["bits"]
+
+    return layout
+
+
+def _selectors(encapsulation_fields, parent_fields: list[dict]) -> list[tuple[dict, list[int]]]:
+    """Parent fields and the option values selected in the editor that identify the child protocol."""
+    by_id = {field["id"]: field for field in parent_fields}
+    selectors = []
+
+    for selected in encapsulation_fields or []:
+        field = by_id.get(selected.get("id"))
+        values = [option["value"] for option in selected.get("field_options") or [] if option.get("used_for_encapsulation")]
+
+        if field is None or not values or field["variable"] or not 0 < field["bits"] <= MAX_SELECTOR_BITS:
+            continue
+
+        selectors.append((field, values))
+
+    return selectors
+
+
+def _layer_order(protocol_ids: list[str], edges: list[tuple[str, str]]) -> list[str]:
+    """Lowest layers first, protocols are only placed once all of their parents are."""
+    parents = {protocol_id: set() for protocol_id in protocol_ids}
+    for parent_id, child_id in edges:
+        parents[child_id].add(parent_id)
+
+    ordered = []
+    placed = set()
+
+    while len(ordered) < len(protocol_ids):
+        ready = [protocol_id for protocol_id in protocol_ids if protocol_id not in placed and parents[protocol_id] <= placed]
+        # The closure table rules out cycles, this only guards against a corrupt definition
+        ready = ready or [protocol_id for protocol_id in protocol_ids if protocol_id not in placed]
+
+        ordered.extend(ready)
+        placed.update(ready)
+
+    return ordered
+
+
+def build_stack(protocols: list[dict], encapsulations: list[dict]) -> list[dict]:
+    """
+    Turn protocol definitions (id, name, description, version, fields) and the encapsulations between them
+    into layers, ordered from the lowest protocol up. Every layer knows the children it can dispatch to.
+    """
+    by_id = {protocol["id"]: protocol for protocol in protocols}
+    edges = [
+        (encapsulation["parent_protocol_id"], encapsulation["protocol_id"])
+        for encapsulation in encapsulations
+        if encapsulation["parent_protocol_id"] in by_id and encapsulation["protocol_id"] in by_id
+    ]
+
+    taken = set()
+    layers = {}
+
+    for protocol_id in _layer_order([protocol["id"] for protocol in protocols], edges):
+        protocol = by_id[protocol_id]
+        layers[protocol_id] = {
+            "id": protocol_id,
+            "name": unique(identifier(protocol["name"]), taken),
+            "display_name": protocol["name"],
+            "description": protocol.get("description") or "",
+            "version": protocol.get("version") or "",
+            "fields": _layout(protocol["fields"]),
+            "children": [],
+            "parents": [],
+        }
+
+    for encapsulation in encapsulations:
+        parent = layers.get(encapsulation["parent_protocol_id"])
+        child = layers.get(encapsulation["protocol_id"])
+
+        if parent is None or child is None:
+            continue
+
+        parent["children"].append({
+            "layer": child,
+            "selectors": _selectors(encapsulation.get("fields"), parent["fields"]),
+        })
+        child["parents"].append(parent)
+
+    return list(layers.values())
+
+
+def payload_field(layer: dict):
+    """The field the encapsulated protocol is carried in, if the protocol marks one."""
+    return next((field for field in layer["fields"] if field.get("encapsulate")), None)
@@ -11,4 +11,37 @@ class Settings(BaseSettings):
     DATABASE_USER: str
     DATABASE_PASSWORD: str
 
+    SVG_PROCESS_WORKERS: int = 2
+    RENDER_CACHE_DIR: str = "static/renders"
+    # Least recently used renders are removed once the cache grows past this size
+    RENDER_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    RENDER_CACHE_PRUNE_INTERVAL: int = 60
+    # Renders that would need more rows are refused
+    RENDER_MAX_ROWS: int = 4096
+    CODEGEN_CACHE_DIR: str = "static/codegen"
+    # Same least recently used pruning as the render cache
+    CODEGEN_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CODEGEN_CACHE_PRUNE_INTERVAL: int = 60
+
+    # Encoded JSON of single protocols and encapsulations kept across requests
+    SERIALIZED_CACHE_SIZE: int = 50000
+
+    # The change log is replayed to clients resuming their change feed, clients further behind reload everything
+    CHANGES_RETENTION_DAYS: int = 7
+    CHANGES_PRUNE_INTERVAL: int = 3600
+
+    # Largest single file accepted in a library archive
+    LIBRARY_MAX_MEMBER_SIZE: int = 16 * 1024 * 1024
+
+    # Shared catalog of standard protocols, published versions are cached for good,
+    # the lists of versions for CATALOG_CACHE_TTL seconds
+    CATALOG_DIR: str = "catalog"
+    CATALOG_CACHE_TTL: int = 60
+
+    # Admins can profile a single request with ?profile=1 or the X-Profile header,
+    # a sample rate above 0 additionally profiles that share of all requests
+    PROFILING_DIR: str = "profiles"
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_KEEP: int = 200
+
 settings = Settings()
@@ -0,0 +1,206 @@
+import datetime
+import json
+import os
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import Protocol, ProtocolEncapsulation, ProtocolField
+from src.serialization import RawJSONResponse, encode_protocol, json_array, protocol_columns
+from src.crud import protocol_encapsulation_closure as closure
+from src.crud import changes  # noqa: F401 - registers the change feed listeners
+from src.crud.search import index_protocol_fields
+from src.svg.metadata import parse_metadata
+from src.svg.optimizer import optimize_svg
+
+# Catalog ids are derived from slug and version, so every deployment publishes the same ids
+CATALOG_NAMESPACE = uuid.UUID("6f1c2b7e-3d4a-5e8f-9a0b-1c2d3e4f5a6b")
+
+
+class ReadThroughCache:
+    """
+    Values loaded from the database on first use and shared by every request in the process.
+    Without a ttl they are kept for good, which is only right for values that never change.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, key, load):
+        entry = self.entries.get(key)
+
+        if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+            return entry[1]
+
+        value = load()
+        self.entries[key] = (time.monotonic(), value)
+
+        return value
+
+
+# A published version never changes, but new versions can be published while the process runs
+catalog_entries = ReadThroughCache()
+catalog_listings = ReadThroughCache(settings.CATALOG_CACHE_TTL)
+
+
+def visible_to(user_id: int):
+    """Filter for the protocols a user can read: their own and the catalog."""
+    return or_(Protocol.user_id == user_id, Protocol.user_id.is_(None))
+
+
+def catalog_protocol_id(slug: str, version: str) -> uuid.UUID:
+    return uuid.uuid5(CATALOG_NAMESPACE, f"{slug}@{version}")
+
+
+def _catalog_query(db: Session):
+    return db.query(*protocol_columns()).filter(Protocol.user_id.is_(None)).order_by(Protocol.catalog_slug, Protocol.created_at, Protocol.version)
+
+
+def _read_entry(slug: str, version: str, db: Session) -> bytes:
+    row = _catalog_query(db).filter(Protocol.catalog_slug == slug, Protocol.version == version).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Catalog protocol {slug} {version} not found")
+
+    return encode_protocol(row)
+
+
+def _read_listing(db: Session, slug: str = None) -> bytes:
+    query = _catalog_query(db)
+
+    if slug is not None:
+        query = query.filter(Protocol.catalog_slug == slug)
+
+    rows = query.all()
+
+    if slug is not None and not rows:
+        raise HTTPException(status_code=404, detail=f"Catalog protocol {slug} not found")
+
+    return json_array(encode_protocol(row) for row in rows)
+
+
+async def read_catalog(db: Session) -> RawJSONResponse:
+    return RawJSONResponse(catalog_listings.get(("catalog",), lambda: _read_listing(db)))
+
+async def read_catalog_versions(slug: str, db: Session) -> RawJSONResponse:
+    return RawJSONResponse(catalog_listings.get(("versions", slug), lambda: _read_listing(db, slug)))
+
+async def read_catalog_entry(slug: str, version: str, db: Session) -> RawJSONResponse:
+    return RawJSONResponse(catalog_entries.get((slug, version), lambda: _read_entry(slug, version, db)))
+
+
+# Publishing
+def load_manifest(catalog_dir: str = None) -> tuple[list[dict], list[dict]]:
+    """Catalog protocols with their SVG and metadata, and the encapsulations between them."""
+    catalog_dir = catalog_dir or settings.CATALOG_DIR
+
+    with open(os.path.join(catalog_dir, "catalog.json")) as f:
+        manifest = json.load(f)
+
+    protocols = []
+
+    for entry in manifest["protocols"]:
+        with open(os.path.join(catalog_dir, entry["svg"]), "rb") as f:
+            svg = f.read()
+
+        metadata = parse_metadata(svg)
+        protocols.append({**entry, "svg": svg, "info": metadata["info"], "fields": metadata["fields"]})
+
+    return protocols, manifest["encapsulations"]
+
+
+def _encapsulation_fields(parent_fields: list[dict], field_id: str, options: list[dict]) -> list[dict]:
+    """The parent field the encapsulation is selected by, stored the way the editor stores it."""
+    field = next(field for field in parent_fields if field["id"] == field_id)
+    values = {option["value"] for option in options}
+
+    field_options = [{**option, "used_for_encapsulation": option["value"] in values} for option in field["field_options"]]
+    known = {option["value"] for option in field["field_options"]}
+    field_options += [{**option, "used_for_encapsulation": True} for option in options if option["value"] not in known]
+
+    return [{**field, "field_options": field_options}]
+
+
+def publish_catalog(db: Session, catalog_dir: str = None) -> dict:
+    """
+    Insert the catalog versions and encapsulations that are not published yet. Published versions are
+    never touched again, a changed protocol has to be published under a new version.
+    """
+    protocols, encapsulations = load_manifest(catalog_dir)
+    summary = {"protocols": 0, "encapsulations": 0}
+    now = datetime.datetime.now()
+
+    keys = {}
+    fields = {}
+
+    for protocol in protocols:
+        key = f"{protocol['slug']}@{protocol['info']['version']}"
+        protocol_id = catalog_protocol_id(protocol["slug"], protocol["info"]["version"])
+        keys[key] = protocol_id
+        fields[key] = protocol["fields"]
+
+        # SVGs are rewritten if missing, static/ is a volume that may be newer than the database
+        if not os.path.exists(f"static/{protocol_id}.svg"):
+            with open(f"static/{protocol_id}.original.svg", "wb") as f:
+                f.write(protocol["svg"])
+
+            with open(f"static/{protocol_id}.svg", "wb") as f:
+                f.write(optimize_svg(protocol["svg"]))
+
+        if db.query(Protocol.id).filter(Protocol.id == protocol_id).first() is not None:
+            # Catalogs published before fields were indexed for search get them on the next run
+            if db.query(ProtocolField.field_id).filter(ProtocolField.protocol_id == protocol_id).first() is None:
+                index_protocol_fields(protocol_id, None, protocol["fields"], db, commit=False)
+            continue
+
+        db.add(Protocol(
+            id=protocol_id,
+            user_id=None,
+            catalog_slug=protocol["slug"],
+            name=protocol["info"]["name"],
+            author=protocol["info"]["author"],
+            version=protocol["info"]["version"],
+            description=protocol["info"]["description"],
+            created_at=now,
+            updated_at=now,
+        ))
+        index_protocol_fields(protocol_id, None, protocol["fields"], db, commit=False)
+        summary["protocols"] += 1
+
+    db.flush()
+
+    closure.lock_closure(db)
+
+    for encapsulation in encapsulations:
+        protocol_id = keys[encapsulation["protocol"]]
+        parent_protocol_id = keys[encapsulation["parent"]]
+
+        exists = (
+            db.query(ProtocolEncapsulation.id)
+            .filter(ProtocolEncapsulation.protocol_id == protocol_id, ProtocolEncapsulation.parent_protocol_id == parent_protocol_id)
+            .first()
+        )
+
+        if exists is not None:
+            continue
+
+        db.add(ProtocolEncapsulation(
+            id=uuid.uuid5(CATALOG_NAMESPACE, f"{encapsulation['protocol']}<{encapsulation['parent']}"),
+            protocol_id=protocol_id,
+            parent_protocol_id=parent_protocol_id,
+            fields=json.dumps(_encapsulation_fields(fields[encapsulation["parent"]], encapsulation["field"], encapsulation["options"])),
+            created_at=now,
+            updated_at=now,
+        ))
+        # Flush per edge, so the closure rows of one edge are in place for the next
+        db.flush()
+        summary["encapsulations"] += 1
+
+    db.commit()
+
+    return summary
@@ -0,0 +1,162 @@
+import time
+from typing import Optional
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.config import settings
+from src.database import SessionLocal
+from src.models import Protocol, ProtocolChange, ProtocolEncapsulation
+
+CHANNEL = "protocol_changes"
+CHANGES_LOCK_ID = 92641637
+
+# Sequence numbers are taken on insert but become visible on commit. Writers of one user's changes take
+# this lock until they commit, so a user's changes commit in sequence order and a stream can resume from
+# the last sequence number it sent without missing a change that committed late.
+LOCK_USER_CHANGES = text("SELECT pg_advisory_xact_lock(:lock_id, :user_id)")
+
+LOCK_ENCAPSULATION_CHANGES = text("""
+    SELECT pg_advisory_xact_lock(:lock_id, user_id) FROM protocols WHERE id = :protocol_id AND user_id IS NOT NULL
+""")
+
+# The NOTIFY is sent in the writing transaction, so listeners only hear about committed changes
+RECORD_PROTOCOL_CHANGE = text(f"""
+    WITH change AS (
+        INSERT INTO protocol_changes (user_id, kind, protocol_id)
+        VALUES (:user_id, :kind, :protocol_id)
+        RETURNING seq, user_id, kind, protocol_id, encapsulation_id
+    )
+    SELECT pg_notify('{CHANNEL}', row_to_json(change)::text) FROM change
+""")
+
+# Encapsulations belong to the owner of the encapsulated protocol, the parent may be a catalog protocol.
+# Encapsulations within the catalog have no owner and are not recorded.
+RECORD_ENCAPSULATION_CHANGE = text(f"""
+    WITH change AS (
+        INSERT INTO protocol_changes (user_id, kind, protocol_id, encapsulation_id)
+        SELECT user_id, 'encapsulation_changed', :protocol_id, :encapsulation_id
+        FROM protocols WHERE id = :protocol_id AND user_id IS NOT NULL
+        RETURNING seq, user_id, kind, protocol_id, encapsulation_id
+    )
+    SELECT pg_notify('{CHANNEL}', row_to_json(change)::text) FROM change
+""")
+
+
+def change_to_dict(change: ProtocolChange) -> dict:
+    return {
+        "seq": change.seq,
+        "user_id": change.user_id,
+        "kind": change.kind,
+        "protocol_id": str(change.protocol_id),
+        "encapsulation_id": str(change.encapsulation_id) if change.encapsulation_id else None,
+    }
+
+
+def read_changes_since(user_id: int, seq: int, db: Session) -> Optional[list[dict]]:
+    """A user's changes after seq, or None if some of them may have been pruned and the client has to reload."""
+    oldest = db.query(func.min(ProtocolChange.seq)).scalar()
+
+    if oldest is not None and seq < oldest - 1:
+        return None
+
+    changes = (
+        db.query(ProtocolChange)
+        .filter(ProtocolChange.user_id == user_id, ProtocolChange.seq > seq)
+        .order_by(ProtocolChange.seq)
+        .all()
+    )
+    return [change_to_dict(change) for change in changes]
+
+
+def read_latest_seq(user_id: int, db: Session) -> int:
+    """Where a new stream starts: the user's latest change, and no further back than the log goes."""
+    latest = db.query(func.max(ProtocolChange.seq)).filter(ProtocolChange.user_id == user_id).scalar() or 0
+    oldest = db.query(func.min(ProtocolChange.seq)).scalar() or 1
+
+    return max(latest, oldest - 1)
+
+
+def replay_changes(user_id: int, seq: Optional[int]) -> tuple[int, Optional[list[dict]]]:
+    """
+    The sequence number a stream resumes from and the changes after it, in a session of its own as streams
+    outlive their request. Runs synchronously, call it from a worker thread.
+    """
+    db = SessionLocal()
+
+    try:
+        if seq is None:
+            return read_latest_seq(user_id, db), []
+
+        return seq, read_changes_since(user_id, seq, db)
+    finally:
+        db.close()
+
+
+def prune_changes(retention_days: int):
+    """Remove changes older than the retention period. The latest change is kept, it marks how far the log was pruned."""
+    db = SessionLocal()
+
+    try:
+        db.execute(text("""
+            DELETE FROM protocol_changes
+            WHERE created_at < now() - make_interval(days => :days)
+              AND seq < (SELECT max(seq) FROM protocol_changes)
+        """), {"days": retention_days})
+        db.commit()
+    finally:
+        db.close()
+
+
+_last_prune = 0.0
+
+
+async def maybe_prune_changes():
+    # Every process prunes at most once per interval, deleting twice is harmless
+    global _last_prune
+
+    if time.monotonic() - _last_prune < settings.CHANGES_PRUNE_INTERVAL:
+        return
+
+    _last_prune = time.monotonic()
+    await run_in_threadpool(prune_changes, settings.CHANGES_RETENTION_DAYS)
+
+
+def _record_protocol_change(connection, target, kind):
+    # Catalog protocols are shared and never change once published
+    if target.user_id is None:
+        return
+
+    connection.execute(LOCK_USER_CHANGES, {"lock_id": CHANGES_LOCK_ID, "user_id": target.user_id})
+    connection.execute(RECORD_PROTOCOL_CHANGE, {"user_id": target.user_id, "kind": kind, "protocol_id": str(target.id)})
+
+
+def _record_encapsulation_change(connection, target):
+    connection.execute(LOCK_ENCAPSULATION_CHANGES, {"lock_id": CHANGES_LOCK_ID, "protocol_id": str(target.protocol_id)})
+    connection.execute(RECORD_ENCAPSULATION_CHANGE, {
+        "protocol_id": str(target.protocol_id),
+        "encapsulation_id": str(target.id),
+    })
+
+
+@event.listens_for(Protocol, "after_insert")
+def _protocol_created(mapper, connection, target):
+    _record_protocol_change(connection, target, "created")
+
+
+@event.listens_for(Protocol, "after_update")
+def _protocol_updated(mapper, connection, target):
+    _record_protocol_change(connection, target, "updated")
+
+
+@event.listens_for(Protocol, "after_delete")
+def _protocol_deleted(mapper, connection, target):
+    _record_protocol_change(connection, target, "deleted")
+
+
+@event.listens_for(ProtocolEncapsulation, "after_insert")
+@event.listens_for(ProtocolEncapsulation, "after_update")
+@event.listens_for(ProtocolEncapsulation, "after_delete")
+def _encapsulation_changed(mapper, connection, target):
+    _record_encapsulation_change(connection, target)
@@ -0,0 +1,78 @@
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import NoResultFound
+
+from src.models import Protocol, ProtocolEncapsulation
+from src.crud import protocol_encapsulation_closure as closure
+from src.crud.catalog import visible_to
+from src.codegen.generator import TARGETS, generate_code_cached
+from src.codegen.model import identifier
+
+
+def _read_svg(protocol_id):
+    try:
+        with open(f"static/{protocol_id}.svg", "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _encapsulation_fields(fields):
+    # Older rows hold the JSON string the editor sent instead of the decoded list
+    return json.loads(fields) if isinstance(fields, str) else fields
+
+
+async def generate_protocol_code(protocol_id: str, target: str, options, current_user, db: Session) -> FileResponse:
+    try:
+        protocol_model = db.query(Protocol).filter(Protocol.id == protocol_id, visible_to(current_user.id)).one()
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
+
+    svg = _read_svg(protocol_model.id)
+
+    if svg is None:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} has no SVG")
+
+    # The protocol and every protocol it can be carried in, lowest layers are resolved by the generator
+    stack = [protocol_model] + [
+        protocol for protocol in closure.read_ancestors(protocol_model.id, db)
+        if protocol.user_id in (current_user.id, None)
+    ]
+    stack.sort(key=lambda protocol: (protocol.name, str(protocol.id)))
+    ids = [protocol.id for protocol in stack]
+
+    encapsulations = (
+        db.query(ProtocolEncapsulation)
+        .filter(ProtocolEncapsulation.protocol_id.in_(ids), ProtocolEncapsulation.parent_protocol_id.in_(ids))
+        .order_by(ProtocolEncapsulation.id)
+        .all()
+    )
+
+    protocols = [
+        {
+            "id": str(protocol.id),
+            "name": protocol.name,
+            "description": protocol.description,
+            "version": protocol.version,
+            "svg": svg if protocol.id == protocol_model.id else _read_svg(protocol.id),
+        }
+        for protocol in stack
+    ]
+    encapsulation_rows = [
+        {
+            "protocol_id": str(encapsulation.protocol_id),
+            "parent_protocol_id": str(encapsulation.parent_protocol_id),
+            "fields": _encapsulation_fields(encapsulation.fields),
+        }
+        for encapsulation in encapsulations
+    ]
+
+    path = await generate_code_cached(target, str(protocol_model.id), protocols, encapsulation_rows, options.dict())
+
+    name = identifier(protocol_model.name)
+    filename = f"{name}_dissector.lua" if target == "lua" else f"{name}.{TARGETS[target]['suffix']}"
+
+    return FileResponse(path, media_type=TARGETS[target]["media_type"], filename=filename)
@@ -0,0 +1,352 @@
+import datetime
+import io
+import json
+import os
+import tarfile
+import time
+import uuid
+from xml.etree.ElementTree import ParseError
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, aliased
+
+from src.config import settings
+from src.database import SessionLocal
+from src.models import Protocol, ProtocolEncapsulation
+from src.crud import protocol_encapsulation_closure as closure
+from src.crud import changes  # noqa: F401 - registers the change feed listeners
+from src.crud.search import index_protocol_fields
+from src.svg.metadata import parse_metadata
+from src.svg.optimizer import optimize_svg
+from src.svg.renderer import invalidate_protocol_renders
+from src.svg.validator import validate_svg
+
+ARCHIVE_FORMAT = "protocol-designer-library"
+ARCHIVE_VERSION = 1
+
+# Rows per manifest chunk on export, and per transaction on import
+CHUNK_SIZE = 500
+
+PROTOCOL_KEYS = ["id", "name", "author", "version", "description", "created_at", "updated_at"]
+
+
+class _ArchiveBuffer:
+    """Write target for tarfile in stream mode, drained after every member."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _add_member(archive: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def _jsonl(rows: list[dict]) -> bytes:
+    return "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+
+
+def _read_file(path: str):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _protocol_to_dict(protocol: Protocol) -> dict:
+    return {key: getattr(protocol, key) for key in PROTOCOL_KEYS}
+
+
+def _encapsulation_to_dict(encapsulation: ProtocolEncapsulation) -> dict:
+    return {
+        "id": encapsulation.id,
+        "protocol_id": encapsulation.protocol_id,
+        "parent_protocol_id": encapsulation.parent_protocol_id,
+        "fields": encapsulation.fields,
+    }
+
+
+def export_library(user_id: int):
+    """
+    Yield a tar archive of a user's library. Rows come from server-side cursors and every member is
+    flushed as soon as it is written, so memory use doesn't grow with the library.
+
+    This is a plain generator, Starlette iterates it in a worker thread.
+    """
+    db = SessionLocal()
+    buffer = _ArchiveBuffer()
+    archive = tarfile.open(fileobj=buffer, mode="w|")
+
+    try:
+        _add_member(archive, "manifest.json", json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "exported_at": datetime.datetime.now().isoformat(),
+        }).encode())
+        yield buffer.drain()
+
+        protocols = (
+            db.query(Protocol)
+            .filter(Protocol.user_id == user_id)
+            .order_by(Protocol.id)
+            .execution_options(stream_results=True)
+            .yield_per(CHUNK_SIZE)
+        )
+
+        chunk = []
+        chunk_number = 0
+
+        def flush_protocols():
+            _add_member(archive, f"protocols/{chunk_number:06d}.jsonl", _jsonl([_protocol_to_dict(p) for p in chunk]))
+
+            for protocol in chunk:
+                for suffix in ["svg", "original.svg"]:
+                    data = _read_file(f"static/{protocol.id}.{suffix}")
+                    if data is not None:
+                        _add_member(archive, f"svg/{protocol.id}.{suffix}", data)
+
+        for protocol in protocols:
+            chunk.append(protocol)
+
+            if len(chunk) == CHUNK_SIZE:
+                flush_protocols()
+                yield buffer.drain()
+                chunk = []
+                chunk_number += 1
+
+        if chunk:
+            flush_protocols()
+            yield buffer.drain()
+
+        # Encapsulations of the user's protocols, including those in catalog protocols which are not exported
+        protocol = aliased(Protocol)
+        encapsulations = (
+            db.query(ProtocolEncapsulation)
+            .join(protocol, protocol.id == ProtocolEncapsulation.protocol_id)
+            .filter(protocol.user_id == user_id)
+            .order_by(ProtocolEncapsulation.id)
+            .execution_options(stream_results=True)
+            .yield_per(CHUNK_SIZE)
+        )
+
+        rows = []
+        chunk_number = 0
+
+        for encapsulation in encapsulations:
+            rows.append(_encapsulation_to_dict(encapsulation))
+
+            if len(rows) == CHUNK_SIZE:
+                _add_member(archive, f"encapsulations/{chunk_number:06d}.jsonl", _jsonl(rows))
+                yield buffer.drain()
+                rows = []
+                chunk_number += 1
+
+        if rows:
+            _add_member(archive, f"encapsulations/{chunk_number:06d}.jsonl", _jsonl(rows))
+
+        archive.close()
+        yield buffer.drain()
+    finally:
+        db.close()
+
+
+def _import_protocols(rows: list[dict], user_id: int, owned: dict, db: Session) -> tuple[int, int, int]:
+    """
+    Insert the protocols of a manifest chunk. owned maps archive ids to the ids in this library: protocols
+    whose id belongs to another account (an archive exported on this server) get a new id.
+    """
+    ids = [uuid.UUID(row["id"]) for row in rows]
+    existing = {
+        protocol_id: owner
+        for protocol_id, owner in db.query(Protocol.id, Protocol.user_id).filter(Protocol.id.in_(ids))
+    }
+
+    imported = 0
+    remapped = 0
+
+    for protocol_id, row in zip(ids, rows):
+        if protocol_id in existing and existing[protocol_id] == user_id:
+            # Protocols already in this library are kept as they are, SVGs and encapsulations still apply
+            owned[protocol_id] = protocol_id
+            continue
+
+        new_id = protocol_id
+
+        if protocol_id in existing:
+            new_id = uuid.uuid4()
+            remapped += 1
+
+        db.add(Protocol(
+            id=new_id,
+            user_id=user_id,
+            name=row["name"],
+            author=row["author"],
+            version=row["version"],
+            description=row["description"],
+            created_at=row.get("created_at") or datetime.datetime.now(),
+            updated_at=row.get("updated_at") or datetime.datetime.now(),
+        ))
+        owned[protocol_id] = new_id
+        imported += 1
+
+    db.commit()
+
+    return imported, len(rows) - imported, remapped
+
+
+def _import_encapsulations(rows: list[dict], owned: dict, db: Session) -> tuple[int, int]:
+    ids = [uuid.UUID(row["id"]) for row in rows]
+    existing = {
+        encapsulation_id: protocol_id
+        for encapsulation_id, protocol_id in db.query(ProtocolEncapsulation.id, ProtocolEncapsulation.protocol_id).filter(ProtocolEncapsulation.id.in_(ids))
+    }
+    parent_ids = [uuid.UUID(row["parent_protocol_id"]) for row in rows]
+    catalog = {protocol_id for (protocol_id,) in db.query(Protocol.id).filter(Protocol.id.in_(parent_ids), Protocol.user_id.is_(None))}
+
+    closure.lock_closure(db)
+
+    imported = 0
+
+    for encapsulation_id, row in zip(ids, rows):
+        protocol_id = owned.get(uuid.UUID(row["protocol_id"]))
+        parent_protocol_id = uuid.UUID(row["parent_protocol_id"])
+        parent_protocol_id = parent_protocol_id if parent_protocol_id in catalog else owned.get(parent_protocol_id)
+
+        if protocol_id is None or parent_protocol_id is None:
+            continue
+
+        if encapsulation_id in existing:
+            # Already in this library, or the id belongs to another account's encapsulation
+            if existing[encapsulation_id] == protocol_id:
+                continue
+            encapsulation_id = uuid.uuid4()
+
+        if closure.creates_cycle(protocol_id, parent_protocol_id, db):
+            continue
+
+        # Exported as the decoded list, older archives may still carry the JSON string
+        fields = row.get("fields")
+        if fields is not None and not isinstance(fields, str):
+            fields = json.dumps(fields)
+
+        db.add(ProtocolEncapsulation(
+            id=encapsulation_id,
+            protocol_id=protocol_id,
+            parent_protocol_id=parent_protocol_id,
+            fields=fields,
+            created_at=datetime.datetime.now(),
+            updated_at=datetime.datetime.now(),
+        ))
+        # Flush per edge, so the next cycle check sees the closure rows of this one
+        db.flush()
+        imported += 1
+
+    db.commit()
+
+    return imported, len(rows) - imported
+
+
+def _import_svg(name: str, data: bytes, user_id: int, owned: dict, db: Session) -> bool:
+    filename = os.path.basename(name)
+    protocol_id, _, suffix = filename.partition(".")
+
+    try:
+        protocol_id = owned.get(uuid.UUID(protocol_id))
+    except ValueError:
+        return False
+
+    if protocol_id is None or suffix not in ("svg", "original.svg"):
+        return False
+
+    if validate_svg(data):
+        return False
+
+    # Same pipeline as an upload, the viewer loads the optimized protocol_id.svg
+    if suffix == "svg":
+        try:
+            data = optimize_svg(data)
+            fields = parse_metadata(data)["fields"]
+        except ParseError:
+            return False
+
+    with open(f"static/{protocol_id}.{suffix}", "wb") as f:
+        f.write(data)
+
+    if suffix == "svg":
+        invalidate_protocol_renders(protocol_id)
+        index_protocol_fields(protocol_id, user_id, fields, db, commit=False)
+
+    return True
+
+
+def import_library(fileobj, user_id: int, db: Session) -> dict:
+    """
+    Load an archive written by export_library. Members are read one at a time and rows are committed
+    per manifest chunk. Runs synchronously, call it from a worker thread.
+
+    Protocols whose ids are taken by another account are imported under new ids, reported as remapped.
+    """
+    owned = {}
+    summary = {"protocols": 0, "encapsulations": 0, "svgs": 0, "skipped": 0, "remapped": 0}
+    pending_svgs = 0
+
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError:
+        raise HTTPException(status_code=400, detail=f"Sorry, that file is not a library archive.")
+
+    with archive:
+        try:
+            for member in archive:
+                if not member.isfile():
+                    continue
+
+                # Checked before reading, members are read into memory whole
+                if member.size > settings.LIBRARY_MAX_MEMBER_SIZE:
+                    db.rollback()
+                    raise HTTPException(status_code=400, detail=f"Sorry, {member.name} in that archive is too large.")
+
+                data = archive.extractfile(member).read()
+
+                if member.name == "manifest.json":
+                    manifest = json.loads(data)
+                    if manifest.get("format") != ARCHIVE_FORMAT or manifest.get("version", 0) > ARCHIVE_VERSION:
+                        raise HTTPException(status_code=400, detail=f"Sorry, that archive format is not supported.")
+                elif member.name.startswith("protocols/"):
+                    rows = [json.loads(line) for line in data.splitlines() if line.strip()]
+                    imported, skipped, remapped = _import_protocols(rows, user_id, owned, db)
+                    summary["protocols"] += imported
+                    summary["skipped"] += skipped
+                    summary["remapped"] += remapped
+                elif member.name.startswith("encapsulations/"):
+                    rows = [json.loads(line) for line in data.splitlines() if line.strip()]
+                    imported, skipped = _import_encapsulations(rows, owned, db)
+                    summary["encapsulations"] += imported
+                    summary["skipped"] += skipped
+                elif member.name.startswith("svg/"):
+                    if _import_svg(member.name, data, user_id, owned, db):
+                        summary["svgs"] += 1
+                        pending_svgs += 1
+
+                    if pending_svgs >= CHUNK_SIZE:
+                        db.commit()
+                        pending_svgs = 0
+        except (tarfile.TarError, ValueError, KeyError) as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Sorry, that archive is corrupt: {e}")
+
+    db.commit()
+
+    return {"message": "Imported library archive", **summary}
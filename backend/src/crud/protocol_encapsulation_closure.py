@@ -0,0 +1,116 @@
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.models import Protocol, ProtocolEncapsulation, ProtocolEncapsulationClosure
+
+# Serializes encapsulation writes, so two concurrent inserts can't both pass the cycle check
+CLOSURE_LOCK_ID = 7977543618
+
+# An encapsulation makes parent_protocol_id an ancestor of protocol_id. Adding or removing it adds or
+# removes (paths to parent) * (paths from child) paths for every ancestor of the parent (and the parent
+# itself) paired with every descendant of the child (and the child itself).
+EDGE_PAIRS = """
+    WITH ancestors AS (
+        SELECT ancestor_id AS id, paths FROM protocol_encapsulation_closure WHERE descendant_id = :parent_id
+        UNION ALL SELECT CAST(:parent_id AS uuid), 1
+    ), descendants AS (
+        SELECT descendant_id AS id, paths FROM protocol_encapsulation_closure WHERE ancestor_id = :child_id
+        UNION ALL SELECT CAST(:child_id AS uuid), 1
+    )
+"""
+
+INSERT_EDGE = text(EDGE_PAIRS + """
+    INSERT INTO protocol_encapsulation_closure (ancestor_id, descendant_id, paths)
+    SELECT ancestors.id, descendants.id, ancestors.paths * descendants.paths
+    FROM ancestors CROSS JOIN descendants
+    ON CONFLICT (ancestor_id, descendant_id)
+    DO UPDATE SET paths = protocol_encapsulation_closure.paths + EXCLUDED.paths
+""")
+
+DELETE_EDGE = text(EDGE_PAIRS + """
+    UPDATE protocol_encapsulation_closure AS closure
+    SET paths = closure.paths - ancestors.paths * descendants.paths
+    FROM ancestors, descendants
+    WHERE closure.ancestor_id = ancestors.id AND closure.descendant_id = descendants.id
+""")
+
+# Only touches the pairs of the removed edge; they can't include the ancestors/descendants rows
+# the CTEs read, since that would require a cycle
+DELETE_UNREACHABLE = text(EDGE_PAIRS + """
+    DELETE FROM protocol_encapsulation_closure AS closure
+    USING ancestors, descendants
+    WHERE closure.ancestor_id = ancestors.id AND closure.descendant_id = descendants.id AND closure.paths <= 0
+""")
+
+
+def lock_closure(db: Session):
+    db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": CLOSURE_LOCK_ID})
+
+
+def rebuild_closure(db: Session, protocol_ids=None):
+    """
+    Recompute the closure edge by edge, for bulk loads that bypass the ORM listeners below. With protocol_ids
+    (a list or a query of ids) only the rows of those protocols' ancestors are rebuilt, which is enough as long
+    as no protocol outside of them is encapsulated in one of them.
+    """
+    lock_closure(db)
+
+    edges = db.query(ProtocolEncapsulation.parent_protocol_id, ProtocolEncapsulation.protocol_id)
+
+    if protocol_ids is None:
+        db.execute(text("DELETE FROM protocol_encapsulation_closure"))
+    else:
+        db.query(ProtocolEncapsulationClosure).filter(ProtocolEncapsulationClosure.descendant_id.in_(protocol_ids)).delete(synchronize_session=False)
+        edges = edges.filter(ProtocolEncapsulation.protocol_id.in_(protocol_ids))
+
+    edges = edges.all()
+
+    for parent_id, child_id in edges:
+        db.execute(INSERT_EDGE, {"parent_id": str(parent_id), "child_id": str(child_id)})
+
+    db.commit()
+
+
+def is_ancestor(ancestor_id, descendant_id, db: Session) -> bool:
+    """Primary key lookup, no graph traversal."""
+    return db.query(ProtocolEncapsulationClosure.paths).filter(
+        ProtocolEncapsulationClosure.ancestor_id == ancestor_id,
+        ProtocolEncapsulationClosure.descendant_id == descendant_id,
+    ).first() is not None
+
+
+def creates_cycle(protocol_id, parent_protocol_id, db: Session) -> bool:
+    return str(protocol_id) == str(parent_protocol_id) or is_ancestor(protocol_id, parent_protocol_id, db)
+
+
+def read_ancestors(protocol_id, db: Session, columns=None, criteria=()) -> list[Protocol]:
+    """Protocol objects, or rows of the given columns, optionally restricted by extra filter criteria."""
+    return (
+        db.query(*(columns or [Protocol]))
+        .join(ProtocolEncapsulationClosure, ProtocolEncapsulationClosure.ancestor_id == Protocol.id)
+        .filter(ProtocolEncapsulationClosure.descendant_id == protocol_id, *criteria)
+        .all()
+    )
+
+
+def read_descendants(protocol_id, db: Session, columns=None, criteria=()) -> list[Protocol]:
+    """Protocol objects, or rows of the given columns, optionally restricted by extra filter criteria."""
+    return (
+        db.query(*(columns or [Protocol]))
+        .join(ProtocolEncapsulationClosure, ProtocolEncapsulationClosure.descendant_id == Protocol.id)
+        .filter(ProtocolEncapsulationClosure.ancestor_id == protocol_id, *criteria)
+        .all()
+    )
+
+
+# Keep the closure in sync on every write path, including cascades from deleting a protocol
+@event.listens_for(ProtocolEncapsulation, "after_insert")
+def _add_edge(mapper, connection, target):
+    connection.execute(INSERT_EDGE, {"parent_id": str(target.parent_protocol_id), "child_id": str(target.protocol_id)})
+
+
+@event.listens_for(ProtocolEncapsulation, "after_delete")
+def _remove_edge(mapper, connection, target):
+    params = {"parent_id": str(target.parent_protocol_id), "child_id": str(target.protocol_id)}
+    connection.execute(DELETE_EDGE, params)
+    connection.execute(DELETE_UNREACHABLE, params)
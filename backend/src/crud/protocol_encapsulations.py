@@ -1,6 +1,6 @@
 import json
+import uuid
 from fastapi import Depends, HTTPException
-from copy import deepcopy
 
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
@@ -10,11 +10,28 @@ from sqlalchemy.exc import IntegrityError
 
 from src.models import ProtocolEncapsulation, Protocol
 from src.schemas import ProtocolEncapsulationOut, ProtocolOut
+from src.crud import protocol_encapsulation_closure as closure
+from src.crud.catalog import visible_to
+from src.crud import changes  # noqa: F401 - registers the change feed listeners
+from src.serialization import RawJSONResponse, encapsulation_columns, encode_encapsulation, encode_protocol, json_array, protocol_columns
 
 
 async def create_protocol_encapsulation(protocol_encapsulation, current_user, db: Session) -> ProtocolEncapsulationOut:
     protocol_encapsulation_model = ProtocolEncapsulation(**protocol_encapsulation.dict())
 
+    # Catalog protocols can carry the user's protocols, but can't be encapsulated themselves
+    if db.query(Protocol.id).filter(Protocol.id == protocol_encapsulation.protocol_id, Protocol.user_id == current_user.id).first() is None:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_encapsulation.protocol_id} not found")
+
+    if db.query(Protocol.id).filter(Protocol.id == protocol_encapsulation.parent_protocol_id, visible_to(current_user.id)).first() is None:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_encapsulation.parent_protocol_id} not found")
+
+    closure.lock_closure(db)
+
+    if closure.creates_cycle(protocol_encapsulation.protocol_id, protocol_encapsulation.parent_protocol_id, db):
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Sorry, that protocol encapsulation would create a cycle.")
+
     try:
         db.add(protocol_encapsulation_model)
         db.commit()
@@ -24,78 +41,103 @@ async def create_protocol_encapsulation(protocol_encapsulation, current_user, db
 
     return db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.id == protocol_encapsulation_model.id).one()
 
-async def read_protocol_encapsulations(protocol_id: str, db: Session) -> list[ProtocolEncapsulationOut]:
+def _read_visible_protocol_id(protocol_id, current_user, db: Session) -> uuid.UUID:
+    """Id of a protocol the user can see, their own or a catalog protocol."""
     try:
-        protocol_encapsulation_model = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.parent_protocol_id == protocol_id).all()
-
-        for protocol_encapsulation in protocol_encapsulation_model:
-            protocol_encapsulation.fields = json.dumps(protocol_encapsulation.fields)
-
-        return protocol_encapsulation_model
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail=f"Sorry, this protocol has no encapsulations.")
+        protocol_id = uuid.UUID(str(protocol_id))
     except ValueError:
         raise HTTPException(status_code=400, detail=f"Sorry, that protocol ID is invalid.")
 
-async def read_protocol_encapsulation_breadcrumbs(protocol_id, db: Session) -> list[list[ProtocolOut]]:
-    try:
-        protocol_encapsulation_models = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.protocol_id == protocol_id).all()
-    except NoResultFound:
+    if db.query(Protocol.id).filter(Protocol.id == protocol_id, visible_to(current_user.id)).first() is None:
         raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
 
-    breadcrumbs = []
+    return protocol_id
 
-    current_breadcrumbs = []
+async def read_protocol_encapsulations(protocol_id: str, current_user, db: Session) -> RawJSONResponse:
+    protocol_id = _read_visible_protocol_id(protocol_id, current_user, db)
 
-    for protocol_encapsulation in protocol_encapsulation_models:
-        current_breadcrumbs.append(protocol_encapsulation.parent_protocol)
+    # Everyone shares the catalog protocols, only the user's own protocols encapsulated in them are listed
+    rows = (
+        db.query(*encapsulation_columns())
+        .join(Protocol, Protocol.id == ProtocolEncapsulation.protocol_id)
+        .filter(ProtocolEncapsulation.parent_protocol_id == protocol_id, visible_to(current_user.id))
+        .all()
+    )
 
-    breadcrumbs.append(deepcopy(current_breadcrumbs))
+    return RawJSONResponse(json_array(encode_encapsulation(row) for row in rows))
 
-    while breadcrumbs[-1]:
-        current_breadcrumbs = []
+def _read_graph(protocol_id, current_user, db: Session) -> tuple[uuid.UUID, dict, dict]:
+    """The visible ancestors of a protocol and the encapsulations between them in two queries, instead of one per node."""
+    protocol_id = _read_visible_protocol_id(protocol_id, current_user, db)
 
-        for protocol in breadcrumbs[-1]:
-            try:
-                protocol_encapsulation_models = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.protocol_id == protocol.id).all()
-            except NoResultFound:
-                break
+    rows = {row.id: row for row in closure.read_ancestors(protocol_id, db, columns=protocol_columns(), criteria=[visible_to(current_user.id)])}
 
-            for protocol_encapsulation in protocol_encapsulation_models:
-                if protocol_encapsulation.parent_protocol not in current_breadcrumbs:
-                    current_breadcrumbs.append(protocol_encapsulation.parent_protocol)
+    parents = {}
+    edges = (
+        db.query(ProtocolEncapsulation.protocol_id, ProtocolEncapsulation.parent_protocol_id)
+        .filter(ProtocolEncapsulation.protocol_id.in_([protocol_id, *rows]))
+    )
+    for child_id, parent_id in edges:
+        if parent_id in rows:
+            parents.setdefault(child_id, []).append(parent_id)
 
-        breadcrumbs.append(deepcopy(current_breadcrumbs))
+    return protocol_id, rows, parents
 
-    breadcrumbs.pop()
+async def read_protocol_encapsulation_breadcrumbs(protocol_id, current_user, db: Session) -> RawJSONResponse:
+    protocol_id, rows, parents = _read_graph(protocol_id, current_user, db)
 
-    return breadcrumbs
+    # One level per step down the stack, each protocol listed once per level
+    breadcrumbs = []
+    level = parents.get(protocol_id, [])
 
-async def read_protocol_encapsulation_tree(protocol_id, db: Session):
-    try:
-        protocol_encapsulation_models = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.protocol_id == protocol_id).all()
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail=f"Protocol encapsulation for {protocol_id} not found")
+    while level:
+        breadcrumbs.append(level)
+        next_level = []
 
-    try:
-        protocol = db.query(Protocol).filter(Protocol.id == protocol_id).one()
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
+        for child_id in level:
+            for parent_id in parents.get(child_id, []):
+                if parent_id not in next_level:
+                    next_level.append(parent_id)
+
+        level = next_level
+
+    return RawJSONResponse(json_array(json_array(encode_protocol(rows[parent_id]) for parent_id in level) for level in breadcrumbs))
+
+def _encode_tree(protocol_id, rows: dict, parents: dict, encoded: dict) -> bytes:
+    # Shared ancestors are encoded once and their bytes reused wherever they appear in the tree
+    if protocol_id not in encoded:
+        subtrees = [_encode_tree(parent_id, rows, parents, encoded) for parent_id in parents.get(protocol_id, [])]
+        encoded[protocol_id] = encode_protocol(rows[protocol_id])[:-1] + b',"parents":' + json_array(subtrees) + b"}"
 
-    protocol_tree = protocol.__dict__
+    return encoded[protocol_id]
 
-    protocol_tree['parents'] = []
+async def read_protocol_encapsulation_tree(protocol_id, current_user, db: Session) -> RawJSONResponse:
+    protocol_id, rows, parents = _read_graph(protocol_id, current_user, db)
 
-    for protocol_encapsulation in protocol_encapsulation_models:
-        try:
-            protocol_tree['parents'].append(await read_protocol_encapsulation_tree(protocol_encapsulation.parent_protocol_id, db))
-        except HTTPException:
-            pass
-    return protocol_tree
+    rows[protocol_id] = db.query(*protocol_columns()).filter(Protocol.id == protocol_id).one()
+
+    return RawJSONResponse(_encode_tree(protocol_id, rows, parents, {}))
+
+async def read_protocol_ancestors(protocol_id, current_user, db: Session) -> RawJSONResponse:
+    protocol_id = _read_visible_protocol_id(protocol_id, current_user, db)
+    rows = closure.read_ancestors(protocol_id, db, columns=protocol_columns(), criteria=[visible_to(current_user.id)])
+
+    return RawJSONResponse(json_array(encode_protocol(row) for row in rows))
+
+async def read_protocol_descendants(protocol_id, current_user, db: Session) -> RawJSONResponse:
+    protocol_id = _read_visible_protocol_id(protocol_id, current_user, db)
+    rows = closure.read_descendants(protocol_id, db, columns=protocol_columns(), criteria=[visible_to(current_user.id)])
+
+    return RawJSONResponse(json_array(encode_protocol(row) for row in rows))
 
 async def update_protocol_encapsulation(encapsulation_id, protocol_encapsulation, current_user, db: Session):
     try:
-        protocol_encapsulation_model = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.id == encapsulation_id).one()
+        protocol_encapsulation_model = (
+            db.query(ProtocolEncapsulation)
+            .join(Protocol, Protocol.id == ProtocolEncapsulation.protocol_id)
+            .filter(ProtocolEncapsulation.id == encapsulation_id, Protocol.user_id == current_user.id)
+            .one()
+        )
     except NoResultFound:
         raise HTTPException(status_code=404, detail=f"Protocol Encapsulation {encapsulation_id} not found")
 
@@ -111,10 +153,17 @@ async def update_protocol_encapsulation(encapsulation_id, protocol_encapsulation
 
 async def delete_protocol_encapsulation(encapsulation_id, current_user, db: Session):
     try:
-        protocol_encapsulation_model = db.query(ProtocolEncapsulation).filter(ProtocolEncapsulation.id == encapsulation_id).one()
+        protocol_encapsulation_model = (
+            db.query(ProtocolEncapsulation)
+            .join(Protocol, Protocol.id == ProtocolEncapsulation.protocol_id)
+            .filter(ProtocolEncapsulation.id == encapsulation_id, Protocol.user_id == current_user.id)
+            .one()
+        )
     except NoResultFound:
         raise HTTPException(status_code=404, detail=f"Protocol Encapsulation {encapsulation_id} not found")
 
+    closure.lock_closure(db)
+
     db.delete(protocol_encapsulation_model)
     db.commit()
 
@@ -8,6 +8,10 @@ from sqlalchemy.exc import IntegrityError
 
 from src.models import Protocol
 from src.schemas import ProtocolOut
+from src.serialization import RawJSONResponse, encode_protocol, json_array, protocol_columns
+from src.crud import protocol_encapsulation_closure as closure
+from src.crud.catalog import visible_to
+from src.crud import changes  # noqa: F401 - registers the change feed listeners
 
 
 async def create_protocol(protocol, current_user, db: Session) -> ProtocolOut:
@@ -25,12 +29,14 @@ async def create_protocol(protocol, current_user, db: Session) -> ProtocolOut:
 
 async def read_protocol(protocol_id: str, current_user, db: Session) -> ProtocolOut:
     try:
-        return db.query(Protocol).filter(Protocol.id == protocol_id, Protocol.user_id == current_user.id).one()
+        return db.query(Protocol).filter(Protocol.id == protocol_id, visible_to(current_user.id)).one()
     except NoResultFound:
         raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
 
-async def read_protocols(current_user, db: Session) -> list[ProtocolOut]:
-    return db.query(Protocol).filter(Protocol.user_id == current_user.id).all()
+async def read_protocols(current_user, db: Session) -> RawJSONResponse:
+    rows = db.query(*protocol_columns()).filter(Protocol.user_id == current_user.id).all()
+
+    return RawJSONResponse(json_array(encode_protocol(row) for row in rows))
 
 async def update_protocol(protocol_id: str, protocol, current_user, db: Session) -> ProtocolOut:
     try:
@@ -51,14 +57,28 @@ async def delete_protocol(protocol_id, current_user, db: Session):
     except NoResultFound:
         raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
 
+    # Deleting a protocol cascades to its encapsulations, which updates the closure
+    closure.lock_closure(db)
+
+    deleted_id = protocol_model.id
     db.delete(protocol_model)
     db.commit()
 
+    invalidate_protocol_renders(deleted_id)
+
     return {"message": f"Deleted protocol {protocol_id}"}
 
 
 # Upload and Download Protocol SVG
+from xml.etree.ElementTree import ParseError
+
 from src.schemas import ProtocolSVG
+from src.svg.metadata import parse_metadata
+from src.svg.optimizer import optimize_svg_async
+from src.svg.pool import run_in_pool
+from src.svg.renderer import RenderTooLarge, invalidate_protocol_renders, render_protocol_svg_cached
+from src.svg.validator import validate_svg_async
+from src.crud.search import index_protocol_fields
 
 async def upload_protocol_svg(protocol_id: str, file, current_user, db: Session):
     try:
@@ -66,10 +86,71 @@ async def upload_protocol_svg(protocol_id: str, file, current_user, db: Session)
     except NoResultFound:
         raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
 
-    # Save this file to static, name it protocol_id.svg
+    original = file.file.read()
+
+    errors = await validate_svg_async(original)
+
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Sorry, that SVG has invalid protocol metadata.", "errors": errors})
+
+    try:
+        optimized = await optimize_svg_async(original)
+    except ParseError:
+        raise HTTPException(status_code=400, detail=f"Sorry, that file is not a valid SVG.")
+
+    # Keep the uploaded file next to the optimized one, the viewer loads protocol_id.svg
+    with open(f"static/{protocol_id}.original.svg", "wb") as f:
+        f.write(original)
+
     with open(f"static/{protocol_id}.svg", "wb") as f:
-        f.write(file.file.read())
-        f.close()
+        f.write(optimized)
+
+    invalidate_protocol_renders(protocol_model.id)
+
+    metadata = await run_in_pool(parse_metadata, optimized)
+    index_protocol_fields(protocol_model.id, current_user.id, metadata["fields"], db)
+
+    return {
+        "message": f"Uploaded SVG for protocol {protocol_id}",
+        "original_size": len(original),
+        "optimized_size": len(optimized),
+        "reduction": round(1 - len(optimized) / len(original), 4) if original else 0,
+    }
+
 
-    return {"message": f"Uploaded SVG for protocol {protocol_id}"}
 
+# Server-side rendering
+async def render_protocol(protocol_id: str, options, current_user, db: Session) -> FileResponse:
+    try:
+        protocol_model = db.query(Protocol).filter(Protocol.id == protocol_id, visible_to(current_user.id)).one()
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} not found")
+
+    try:
+        with open(f"static/{protocol_id}.svg", "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Protocol {protocol_id} has no SVG")
+
+    try:
+        metadata = await run_in_pool(parse_metadata, data)
+    except ParseError:
+        raise HTTPException(status_code=400, detail=f"Sorry, the SVG of protocol {protocol_id} is invalid.")
+
+    try:
+        path = await render_protocol_svg_cached(metadata["info"], metadata["fields"], options.dict(), protocol_model.id)
+    except RenderTooLarge:
+        raise HTTPException(status_code=400, detail=f"Sorry, protocol {protocol_id} is too large to render with these options.")
+
+    return FileResponse(path, media_type="image/svg+xml")
+
+async def render_svg(render_in) -> FileResponse:
+    info = render_in.protocol.dict()
+    fields = [field.dict() for field in render_in.fields]
+
+    try:
+        path = await render_protocol_svg_cached(info, fields, render_in.options.dict())
+    except RenderTooLarge:
+        raise HTTPException(status_code=400, detail=f"Sorry, that protocol is too large to render with these options.")
+
+    return FileResponse(path, media_type="image/svg+xml")
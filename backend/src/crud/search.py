@@ -0,0 +1,91 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.models import ProtocolField
+
+# Full-text matches rank first, trigram word similarity catches typos and partial words.
+# Both branches are served by the GIN indexes on search_vector and the gin_trgm_ops columns.
+# Users search their own protocols and the catalog, whose rows have no user_id.
+SEARCH_PROTOCOLS = text("""
+    WITH query AS (
+        SELECT websearch_to_tsquery('simple', :query) AS tsquery
+    ), protocol_hits AS (
+        SELECT p.id AS protocol_id, CAST(NULL AS varchar) AS field_id,
+               ts_rank(p.search_vector, query.tsquery) * 2
+               + greatest(word_similarity(:query, p.name), word_similarity(:query, p.author) * 0.5,
+                          word_similarity(:query, p.description) * 0.3) AS score
+        FROM protocols p, query
+        WHERE (p.user_id = :user_id OR p.user_id IS NULL)
+          AND (p.search_vector @@ query.tsquery OR :query <% p.name OR :query <% p.author OR :query <% p.description)
+    ), field_hits AS (
+        SELECT f.protocol_id, f.field_id,
+               ts_rank(f.search_vector, query.tsquery)
+               + greatest(word_similarity(:query, f.display_name), word_similarity(:query, f.field_id)) * 0.8 AS score
+        FROM protocol_fields f, query
+        WHERE (f.user_id = :user_id OR f.user_id IS NULL)
+          AND (f.search_vector @@ query.tsquery OR :query <% f.display_name OR :query <% f.field_id)
+    ), hits AS (
+        SELECT protocol_id, max(score) AS score, array_remove(array_agg(DISTINCT field_id), NULL) AS matched_fields
+        FROM (SELECT * FROM protocol_hits UNION ALL SELECT * FROM field_hits) AS all_hits
+        GROUP BY protocol_id
+    ), page AS (
+        SELECT p.id, p.user_id, p.catalog_slug, p.name, p.author, p.version, p.description, p.created_at, p.updated_at,
+               hits.score, hits.matched_fields
+        FROM hits
+        JOIN protocols p ON p.id = hits.protocol_id
+        ORDER BY hits.score DESC, p.name
+        LIMIT :limit OFFSET :offset
+    )
+    -- Counted before LIMIT/OFFSET, a page past the end still reports the total in its single empty row
+    SELECT page.*, (SELECT count(*) FROM hits) AS total
+    FROM (SELECT 1) AS always
+    LEFT JOIN page ON true
+    ORDER BY page.score DESC, page.name
+""")
+
+
+async def search_protocols(query: str, limit: int, offset: int, current_user, db: Session) -> dict:
+    query = query.strip()
+
+    if not query:
+        raise HTTPException(status_code=400, detail=f"Sorry, the search query is empty.")
+
+    rows = db.execute(SEARCH_PROTOCOLS, {
+        "query": query,
+        "user_id": current_user.id,
+        "limit": limit,
+        "offset": offset,
+    }).mappings().all()
+
+    return {
+        "total": rows[0]["total"],
+        "items": [{key: value for key, value in row.items() if key != "total"} for row in rows if row["id"] is not None],
+    }
+
+
+def index_protocol_fields(protocol_id, user_id: Optional[int], fields: list[dict], db: Session, commit: bool = True):
+    """Replace the searchable fields of a protocol with the ones from its latest SVG."""
+    db.query(ProtocolField).filter(ProtocolField.protocol_id == protocol_id).delete()
+
+    # Field ids are unique within a protocol, keep the first one if an SVG repeats it
+    unique_fields = {}
+    for field in fields:
+        if field["id"]:
+            unique_fields.setdefault(field["id"], field)
+
+    db.add_all([
+        ProtocolField(
+            protocol_id=protocol_id,
+            field_id=field["id"],
+            user_id=user_id,
+            display_name=field["display_name"],
+            description=field["description"] or None,
+        )
+        for field in unique_fields.values()
+    ])
+
+    if commit:
+        db.commit()
@@ -5,7 +5,11 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 
-engine = create_engine(f"postgresql://{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}",
+DATABASE_URL = f"postgresql://{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+
+# psycopg2 is the driver in requirements.txt, SQLAlchemy 2.1 would default to psycopg 3.
+# DATABASE_URL itself stays a libpq URL, the change feed connects with it directly.
+engine = create_engine(DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1),
                        #echo=True,
                        poolclass=QueuePool,
                        pool_size=5,
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from src import database
+from src.auth.jwthandler import get_current_user
+from src.schemas import ProtocolOut
+
+import src.crud.catalog as crud
+
+router = APIRouter()
+
+@router.get("/catalog", response_model=list[ProtocolOut], dependencies=[Depends(get_current_user)])
+async def read_catalog(db: Session = Depends(database.get_conn)) -> list[ProtocolOut]:
+    return await crud.read_catalog(db)
+
+@router.get("/catalog/{slug}", response_model=list[ProtocolOut], dependencies=[Depends(get_current_user)])
+async def read_catalog_versions(slug: str, db: Session = Depends(database.get_conn)) -> list[ProtocolOut]:
+    return await crud.read_catalog_versions(slug, db)
+
+@router.get("/catalog/{slug}/{version}", response_model=ProtocolOut, dependencies=[Depends(get_current_user)])
+async def read_catalog_entry(slug: str, version: str, db: Session = Depends(database.get_conn)) -> ProtocolOut:
+    return await crud.read_catalog_entry(slug, version, db)
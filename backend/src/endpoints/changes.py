@@ -0,0 +1,91 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from src.auth.jwthandler import get_current_user
+from src.changefeed import change_feed, coalesce
+from src.crud.changes import maybe_prune_changes, replay_changes
+from src.schemas import UserOut
+
+router = APIRouter()
+
+# How long to wait for more changes after the first one, so bursts go out as a single message
+COALESCE_WINDOW = 0.2
+# Below the proxy read timeout in the nginx config
+KEEPALIVE_INTERVAL = 15
+
+# The client is too far behind to catch up from the log and reloads the whole library
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+
+
+def format_event(changes: list[dict]) -> str:
+    return f"id: {changes[-1]['seq']}\nevent: changes\ndata: {json.dumps(changes)}\n\n"
+
+
+async def stream_changes(request: Request, user_id: int, last_seq: Optional[int]):
+    # Subscribed in here, a client gone before the stream started would never be unsubscribed otherwise
+    subscription = change_feed.subscribe(user_id)
+
+    try:
+        # Read after subscribing, so nothing committed in between is lost
+        last_seq, backlog = await run_in_threadpool(replay_changes, user_id, last_seq)
+
+        if backlog is None:
+            yield RESET_EVENT
+            return
+
+        if backlog:
+            yield format_event(coalesce(backlog))
+            last_seq = backlog[-1]["seq"]
+
+        while not await request.is_disconnected():
+            try:
+                changes = [await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_INTERVAL)]
+            except asyncio.TimeoutError:
+                changes = []
+            else:
+                await asyncio.sleep(COALESCE_WINDOW)
+
+                while not subscription.queue.empty():
+                    changes.append(subscription.queue.get_nowait())
+
+            # Some NOTIFYs never reached us, the log has all of them
+            if subscription.missed:
+                subscription.missed = False
+                _, changes = await run_in_threadpool(replay_changes, user_id, last_seq)
+
+                if changes is None:
+                    yield RESET_EVENT
+                    break
+
+            # Changes already sent with the backlog can arrive again through NOTIFY
+            changes = [change for change in changes if change["seq"] > last_seq]
+
+            if not changes:
+                yield ": keepalive\n\n"
+                continue
+
+            changes = coalesce(changes)
+            last_seq = changes[-1]["seq"]
+
+            yield format_event(changes)
+    finally:
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/changes", dependencies=[Depends(get_current_user)])
+async def read_changes(request: Request, since: Optional[int] = None, last_event_id: Optional[int] = Header(None), current_user: UserOut = Depends(get_current_user)):
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    last_seq = last_event_id if last_event_id is not None else since
+
+    await maybe_prune_changes()
+
+    return StreamingResponse(
+        stream_changes(request, current_user.id, last_seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
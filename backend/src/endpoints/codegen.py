@@ -0,0 +1,16 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from src import database
+from src.auth.jwthandler import get_current_user
+from src.schemas import CodegenOptions, UserOut
+
+import src.crud.codegen as crud
+
+router = APIRouter()
+
+@router.get("/protocols/{protocol_id}/codegen/{target}", dependencies=[Depends(get_current_user)])
+async def generate_protocol_code(protocol_id: str, target: Literal["c", "lua"], options: CodegenOptions = Depends(), current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.generate_protocol_code(protocol_id, target, options, current_user, db)
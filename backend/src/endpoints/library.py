@@ -0,0 +1,28 @@
+import datetime
+
+from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from src import database
+from src.auth.jwthandler import get_current_user
+from src.schemas import UserOut
+
+import src.crud.library as crud
+
+router = APIRouter()
+
+@router.get("/library/export", dependencies=[Depends(get_current_user)])
+async def export_library(current_user: UserOut = Depends(get_current_user)):
+    filename = f"protocol-library-{datetime.date.today().isoformat()}.tar"
+
+    return StreamingResponse(
+        crud.export_library(current_user.id),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/library/import", dependencies=[Depends(get_current_user)])
+async def import_library(file: UploadFile = File(...), current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await run_in_threadpool(crud.import_library, file.file, current_user.id, db)
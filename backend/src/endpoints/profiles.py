@@ -0,0 +1,49 @@
+import glob
+import json
+import os
+import re
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from src.auth.jwthandler import get_current_admin
+from src.config import settings
+from src.profiling import profile_path
+
+router = APIRouter()
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _read_profile(profile_id: str) -> dict:
+    if not PROFILE_ID.match(profile_id):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+
+    try:
+        with open(profile_path(profile_id, "json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+
+
+@router.get("/profiles", dependencies=[Depends(get_current_admin)])
+async def read_profiles():
+    profiles = []
+
+    for path in sorted(glob.glob(os.path.join(settings.PROFILING_DIR, "*.json")), key=os.path.getmtime, reverse=True):
+        with open(path) as f:
+            profile = json.load(f)
+        profile.pop("sql", None)
+        profiles.append(profile)
+
+    return profiles
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(get_current_admin)])
+async def read_profile(profile_id: str):
+    return _read_profile(profile_id)
+
+@router.get("/profiles/{profile_id}/pstats", dependencies=[Depends(get_current_admin)])
+async def download_profile(profile_id: str):
+    _read_profile(profile_id)
+
+    return FileResponse(profile_path(profile_id, "prof"), media_type="application/octet-stream", filename=f"{profile_id}.prof")
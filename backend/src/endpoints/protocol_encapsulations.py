@@ -18,8 +18,8 @@ async def create_protocol_encapsulation(protocol_encapsulation: ProtocolEncapsul
     return await crud.create_protocol_encapsulation(protocol_encapsulation, current_user, db)
 
 @router.get("/protocol-encapsulations/{protocol_id}", response_model=list[ProtocolEncapsulationOut], dependencies=[Depends(get_current_user)])
-async def read_protocol_encapsulations(protocol_id: str, db: Session = Depends(database.get_conn)) -> list[ProtocolEncapsulationOut]:
-    return await crud.read_protocol_encapsulations(protocol_id, db)
+async def read_protocol_encapsulations(protocol_id: str, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)) -> list[ProtocolEncapsulationOut]:
+    return await crud.read_protocol_encapsulations(protocol_id, current_user, db)
 
 @router.put("/protocol-encapsulations/{encapsulation_id}", response_model=ProtocolEncapsulationOut, dependencies=[Depends(get_current_user)])
 async def update_protocol_encapsulation(encapsulation_id: str, protocol_encapsulation: ProtocolEncapsulationPatch, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
@@ -30,9 +30,17 @@ async def delete_protocol_encapsulation(encapsulation_id: str, current_user: Use
     return await crud.delete_protocol_encapsulation(encapsulation_id, current_user, db)
 
 @router.get("/protocol-encapsulations/{protocol_id}/breadcrumbs", response_model=list[list[ProtocolOut]], dependencies=[Depends(get_current_user)])
-async def read_protocol_encapsulation_breadcrumbs(protocol_id: str, db: Session = Depends(database.get_conn)):
-    return await crud.read_protocol_encapsulation_breadcrumbs(protocol_id, db)
+async def read_protocol_encapsulation_breadcrumbs(protocol_id: str, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.read_protocol_encapsulation_breadcrumbs(protocol_id, current_user, db)
 
 @router.get("/protocol-encapsulations/{protocol_id}/tree", dependencies=[Depends(get_current_user)])
-async def read_protocol_encapsulation_tree(protocol_id: str, db: Session = Depends(database.get_conn)):
-    return await crud.read_protocol_encapsulation_tree(protocol_id, db)
+async def read_protocol_encapsulation_tree(protocol_id: str, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.read_protocol_encapsulation_tree(protocol_id, current_user, db)
+
+@router.get("/protocol-encapsulations/{protocol_id}/ancestors", response_model=list[ProtocolOut], dependencies=[Depends(get_current_user)])
+async def read_protocol_ancestors(protocol_id: str, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.read_protocol_ancestors(protocol_id, current_user, db)
+
+@router.get("/protocol-encapsulations/{protocol_id}/descendants", response_model=list[ProtocolOut], dependencies=[Depends(get_current_user)])
+async def read_protocol_descendants(protocol_id: str, current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.read_protocol_descendants(protocol_id, current_user, db)
@@ -41,3 +41,15 @@ from src.schemas import ProtocolSVG
 @router.post("/protocols/{protocol_id}/upload", dependencies=[Depends(get_current_user)])
 async def upload_protocol_svg(protocol_id: str, file: UploadFile = File(...), current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
     return await crud.upload_protocol_svg(protocol_id, file, current_user, db)
+
+
+# Server-side rendering
+from src.schemas import ProtocolRenderIn, RenderOptions
+
+@router.get("/protocols/{protocol_id}/render", dependencies=[Depends(get_current_user)])
+async def render_protocol(protocol_id: str, options: RenderOptions = Depends(), current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.render_protocol(protocol_id, options, current_user, db)
+
+@router.post("/render", dependencies=[Depends(get_current_user)])
+async def render_svg(render_in: ProtocolRenderIn):
+    return await crud.render_svg(render_in)
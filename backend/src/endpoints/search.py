@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from src import database
+from src.auth.jwthandler import get_current_user
+from src.schemas import ProtocolSearchPage, UserOut
+
+import src.crud.search as crud
+
+router = APIRouter()
+
+@router.get("/search", response_model=ProtocolSearchPage, dependencies=[Depends(get_current_user)])
+async def search_protocols(q: str = Query(..., max_length=256), limit: int = Query(20, gt=0, le=100), offset: int = Query(0, ge=0), current_user: UserOut = Depends(get_current_user), db: Session = Depends(database.get_conn)):
+    return await crud.search_protocols(q, limit, offset, current_user, db)
@@ -0,0 +1,45 @@
+import os
+import time
+
+# Entries used this recently may be about to be served from disk and are never pruned
+IN_USE_SECONDS = 60
+
+
+def prune_cache_dir(directory: str, max_bytes: int, suffix: str = ""):
+    """
+    Remove the least recently used files ending in suffix until the directory fits in max_bytes. Cache hits
+    touch the mtime, so it orders the files by last use.
+    """
+    in_use = time.time() - IN_USE_SECONDS
+    entries = []
+
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(suffix) and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime > in_use:
+            break
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def touch_cached(path: str) -> bool:
+    """Mark a cache entry as used, False if there is none (or it was just pruned)."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+
+    return True
@@ -1,9 +1,9 @@
-from sqlalchemy import Date, DateTime, Enum, Integer, String, ForeignKey
+from sqlalchemy import BigInteger, Boolean, CheckConstraint, Computed, Date, DateTime, Enum, Integer, String, ForeignKey, Index, false, text
 import enum
 from sqlalchemy.sql.schema import Column
 from src.database import Base
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import relationship, backref, deferred
 import datetime
 
 
@@ -14,6 +14,7 @@ class User(Base):
     email = Column(String(254), unique=True, nullable=True)
     name = Column(String(128), nullable=True)
     password = Column(String(128), nullable=True)
+    is_admin = Column(Boolean, nullable=False, server_default=false())
     created_at = Column(DateTime, nullable=False, default=datetime.datetime.now())
     updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now())
 
@@ -21,16 +22,29 @@ class Protocol(Base):
     __tablename__ = "protocols"
 
     id = Column(UUID(as_uuid=True), server_default="gen_random_uuid()", primary_key=True, index=True, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Catalog protocols have no owner and are identified by their slug and version instead
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    catalog_slug = Column(String, nullable=True)
     name = Column(String, nullable=False)
     author = Column(String, nullable=False)
     version = Column(String, nullable=False)
     description = Column(String, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.datetime.now())
     updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now())
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+        persisted=True,
+    )))
 
     user = relationship("User", backref=backref("protocols", cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        CheckConstraint("(user_id IS NULL) <> (catalog_slug IS NULL)", name="ck_protocols_owner_or_catalog"),
+        Index("ix_protocols_catalog_slug_version", "catalog_slug", "version", unique=True, postgresql_where=text("catalog_slug IS NOT NULL")),
+    )
+
 class ProtocolEncapsulation(Base):
     __tablename__ = "protocol_encapsulations"
 
@@ -43,3 +57,48 @@ class ProtocolEncapsulation(Base):
 
     protocol = relationship("Protocol", backref=backref("protocol", cascade="all, delete-orphan"), uselist=False, foreign_keys=[protocol_id])
     parent_protocol = relationship("Protocol", backref=backref("parent", cascade="all, delete-orphan"), uselist=False, foreign_keys=[parent_protocol_id])
+
+class ProtocolEncapsulationClosure(Base):
+    """Transitive closure of protocol_encapsulations, one row per (ancestor, descendant) pair."""
+    __tablename__ = "protocol_encapsulation_closure"
+
+    ancestor_id = Column(UUID(as_uuid=True), ForeignKey("protocols.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    descendant_id = Column(UUID(as_uuid=True), ForeignKey("protocols.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    # Number of distinct encapsulation paths, so deleting one edge keeps pairs still reachable another way
+    paths = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_protocol_encapsulation_closure_descendant_id", "descendant_id", "ancestor_id"),
+    )
+
+class ProtocolChange(Base):
+    """Append-only log of library changes, replayed to change feed clients resuming from a sequence number."""
+    __tablename__ = "protocol_changes"
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(32), nullable=False)
+    protocol_id = Column(UUID(as_uuid=True), nullable=False)
+    encapsulation_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=text("now()"))
+
+    __table_args__ = (
+        Index("ix_protocol_changes_user_id_seq", "user_id", "seq"),
+    )
+
+class ProtocolField(Base):
+    """Fields extracted from the pd: metadata of a protocol's SVG, kept for search."""
+    __tablename__ = "protocol_fields"
+
+    protocol_id = Column(UUID(as_uuid=True), ForeignKey("protocols.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    field_id = Column(String, primary_key=True, nullable=False)
+    # Copied from the protocol, NULL for catalog protocols
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    display_name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(display_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', replace(coalesce(field_id, ''), '_', ' ')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+        persisted=True,
+    )))
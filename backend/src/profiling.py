@@ -0,0 +1,182 @@
+import cProfile
+import datetime
+import glob
+import json
+import os
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from src.auth.jwthandler import get_user_from_authorization
+from src.config import settings
+from src.database import SessionLocal, engine
+
+PROFILE_HEADER = b"x-profile"
+
+# Long-lived streams would hold the profiler for their whole lifetime
+UNPROFILED_PATHS = ("/changes", "/static")
+
+# Set only while a request is being profiled, so SQL hooks are a single lookup otherwise
+_sql_timeline: ContextVar[Optional[list]] = ContextVar("sql_timeline", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql_timeline.get() is not None:
+        conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timeline = _sql_timeline.get()
+
+    if timeline is None or not conn.info.get("profiling_start"):
+        return
+
+    start = conn.info["profiling_start"].pop()
+    # Parameters are left out on purpose, they can contain password hashes and tokens
+    timeline.append({
+        "start": start,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        "statement": statement,
+        "executemany": executemany,
+    })
+
+
+def profile_path(profile_id: str, suffix: str) -> str:
+    return os.path.join(settings.PROFILING_DIR, f"{profile_id}.{suffix}")
+
+
+def _enabled(value: str) -> bool:
+    return value.strip().lower() not in ("", "0", "false")
+
+
+def _write_profile(profile_id: str, profiler: cProfile.Profile, report: dict):
+    """Blocking file writes, run it in the thread pool."""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id, "prof"))
+
+    with open(profile_path(profile_id, "json"), "w") as f:
+        json.dump(report, f)
+
+    _prune_profiles()
+
+
+def _prune_profiles():
+    profiles = sorted(glob.glob(os.path.join(settings.PROFILING_DIR, "*.json")), key=os.path.getmtime)
+
+    for path in profiles[:-settings.PROFILING_KEEP or None]:
+        profile_id = os.path.basename(path).split(".")[0]
+        for suffix in ["json", "prof"]:
+            try:
+                os.remove(profile_path(profile_id, suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile and the SQL timeline of a single request, for admins who ask for it with
+    ?profile=1 or an X-Profile header, or for a random share of requests when sampling is configured.
+
+    cProfile sees everything running on the event loop thread while the request is in flight, so only
+    one request is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = False
+
+    def _requested(self, scope) -> bool:
+        if b"profile" in scope["query_string"]:
+            values = parse_qs(scope["query_string"].decode()).get("profile", [])
+            if any(_enabled(value) for value in values):
+                return True
+
+        return any(name == PROFILE_HEADER and _enabled(value.decode("latin-1")) for name, value in scope["headers"])
+
+    def _is_admin(self, authorization: str):
+        """Blocking token and user lookup, run it in the thread pool."""
+        db = SessionLocal()
+
+        try:
+            user = get_user_from_authorization(authorization, db)
+        finally:
+            db.close()
+
+        return user if user is not None and user.is_admin else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.active or scope["path"].startswith(UNPROFILED_PATHS):
+            return await self.app(scope, receive, send)
+
+        user = None
+
+        # Anonymous requests asking for a profile never reach the database
+        if self._requested(scope):
+            authorization = Request(scope).cookies.get("Authorization")
+            if authorization:
+                user = await run_in_threadpool(self._is_admin, authorization)
+
+        # Callers who turn out not to be admins are sampled like any other request
+        sampled = user is None and settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+        # Another request may have started profiling while the admin check was running
+        if (user is None and not sampled) or self.active:
+            return await self.app(scope, receive, send)
+
+        await self._profile(scope, receive, send, user)
+
+    async def _profile(self, scope, receive, send, user):
+        profile_id = uuid.uuid4().hex
+        status = None
+
+        async def send_with_profile_id(message):
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+
+            await send(message)
+
+        timeline = []
+        token = _sql_timeline.set(timeline)
+        profiler = cProfile.Profile()
+
+        self.active = True
+        start = time.perf_counter()
+        profiler.enable()
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            _sql_timeline.reset(token)
+            self.active = False
+
+            for query in timeline:
+                query["start_ms"] = round((query.pop("start") - start) * 1000, 3)
+
+            await run_in_threadpool(_write_profile, profile_id, profiler, {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope["query_string"].decode(),
+                "status": status,
+                "user_id": user.id if user else None,
+                "sampled": user is None,
+                "duration_ms": round(duration * 1000, 3),
+                "sql_count": len(timeline),
+                "sql_ms": round(sum(query["duration_ms"] for query in timeline), 3),
+                "created_at": datetime.datetime.now().isoformat(),
+                "sql": timeline,
+            })
@@ -4,6 +4,12 @@ from src.endpoints import users
 from src.endpoints import protocols
 from src.endpoints import protocol_encapsulations
 from src.endpoints import health
+from src.endpoints import changes
+from src.endpoints import search
+from src.endpoints import library
+from src.endpoints import profiles
+from src.endpoints import codegen
+from src.endpoints import catalog
 
 router = APIRouter()
 
@@ -11,3 +17,9 @@ router.include_router(health.router, tags=["health"])
 router.include_router(users.router, tags=["users"])
 router.include_router(protocols.router, tags=["protocols"])
 router.include_router(protocol_encapsulations.router, tags=["protocol encapsulations"])
+router.include_router(changes.router, tags=["changes"])
+router.include_router(search.router, tags=["search"])
+router.include_router(library.router, tags=["library"])
+router.include_router(profiles.router, tags=["profiles"])
+router.include_router(codegen.router, tags=["codegen"])
+router.include_router(catalog.router, tags=["catalog"])
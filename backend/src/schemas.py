@@ -1,5 +1,5 @@
 import datetime
-from typing import Optional
+from typing import Literal, Optional
 import uuid
 from pydantic import BaseModel, EmailStr, StrictStr, validator, Field, Json
 
@@ -49,7 +49,8 @@ class ProtocolBase(BaseModel):
 
 class ProtocolOut(ProtocolBase):
     id: uuid.UUID
-    user_id: int
+    user_id: Optional[int] = None
+    catalog_slug: Optional[str] = None
     created_at: datetime.datetime
     updated_at: datetime.datetime
 
@@ -76,6 +77,15 @@ class ProtocolSVG(BaseModel):
     svg: str
 
 
+class ProtocolSearchResult(ProtocolOut):
+    score: float
+    matched_fields: list[str] = []
+
+class ProtocolSearchPage(BaseModel):
+    total: int
+    items: list[ProtocolSearchResult]
+
+
 class ProtocolEncapsulationBase(BaseModel):
     protocol_id: uuid.UUID
     parent_protocol_id: uuid.UUID
@@ -92,3 +102,36 @@ class ProtocolEncapsulationIn(ProtocolEncapsulationBase):
 
 class ProtocolEncapsulationPatch(BaseModel):
     fields: Json
+
+
+class ProtocolFieldOption(BaseModel):
+    name: StrictStr
+    value: int
+
+class ProtocolField(BaseModel):
+    id: StrictStr
+    display_name: StrictStr
+    # In length_unit, a 64 KiB field is far longer than any header a diagram is useful for
+    length: int = Field(ge=0, le=65536)
+    max_length: Optional[int] = Field(None, ge=0, le=65536)
+    is_variable_length: bool = False
+    length_unit: Literal["bits", "bytes"] = "bits"
+    endian: Literal["big", "little"] = "big"
+    description: Optional[str] = None
+    encapsulate: bool = False
+    group_id: Optional[str] = None
+    field_options: list[ProtocolFieldOption] = []
+
+class RenderOptions(BaseModel):
+    bits_per_row: int = Field(32, gt=0, le=1024)
+    pixels_per_bit: int = Field(32, gt=0, le=256)
+    show_scale: bool = True
+    truncate_variable_length_fields: bool = True
+
+class ProtocolRenderIn(BaseModel):
+    protocol: ProtocolBase
+    fields: list[ProtocolField]
+    options: RenderOptions = RenderOptions()
+
+class CodegenOptions(BaseModel):
+    udp_port: Optional[int] = Field(None, gt=0, le=65535)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+import orjson
+from fastapi.responses import Response
+from sqlalchemy import Text, cast, literal_column
+
+from src.config import settings
+from src.models import Protocol, ProtocolEncapsulation
+
+# Same keys and order as ProtocolOut, so fast path responses are byte-compatible with the pydantic ones
+PROTOCOL_KEYS = ["name", "author", "version", "description", "id", "user_id", "catalog_slug", "created_at", "updated_at"]
+
+
+class RawJSONResponse(Response):
+    """A response whose body is already encoded JSON, FastAPI skips response_model validation for it."""
+    media_type = "application/json"
+
+
+class SerializedCache:
+    """
+    Encoded JSON of single rows, keyed by kind, id and row version and shared by every request in the process.
+    The row version is Postgres' xmin, which changes with every write to the row, so entries never go stale,
+    outdated versions just age out of the LRU.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        data = self.entries.get(key)
+
+        if data is not None:
+            self.entries.move_to_end(key)
+
+        return data
+
+    def put(self, key, data: bytes) -> bytes:
+        self.entries[key] = data
+
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+        return data
+
+
+serialized_cache = SerializedCache(settings.SERIALIZED_CACHE_SIZE)
+
+
+def row_version(table: str):
+    return literal_column(f"{table}.xmin::text")
+
+
+def protocol_columns(prefix: str = "") -> list:
+    """Columns to project protocols to instead of loading ORM objects, prefixed when joined with other tables."""
+    return [getattr(Protocol, key).label(prefix + key) for key in PROTOCOL_KEYS] + [row_version("protocols").label(prefix + "row_version")]
+
+
+def encode_protocol(row, prefix: str = "") -> bytes:
+    cache_key = ("protocol", getattr(row, prefix + "id"), getattr(row, prefix + "row_version"))
+    data = serialized_cache.get(cache_key)
+
+    if data is None:
+        data = serialized_cache.put(cache_key, orjson.dumps({key: getattr(row, prefix + key) for key in PROTOCOL_KEYS}))
+
+    return data
+
+
+def json_array(items) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def encapsulation_columns() -> list:
+    """Encapsulation columns with the encapsulated protocol, fields stay the JSON text Postgres stores."""
+    return [
+        ProtocolEncapsulation.id,
+        ProtocolEncapsulation.protocol_id,
+        ProtocolEncapsulation.parent_protocol_id,
+        cast(ProtocolEncapsulation.fields, Text).label("fields"),
+        ProtocolEncapsulation.created_at,
+        ProtocolEncapsulation.updated_at,
+        row_version("protocol_encapsulations").label("row_version"),
+        *protocol_columns("protocol__"),
+    ]
+
+
+def encode_encapsulation(row) -> bytes:
+    """
+    Same shape as ProtocolEncapsulationOut, the embedded protocol comes from the protocol cache. fields is
+    the stored JSON text as a string, like PUT returns it, the editor parses it itself.
+    """
+    cache_key = ("encapsulation", row.id, row.row_version, row.protocol__row_version)
+    data = serialized_cache.get(cache_key)
+
+    if data is None:
+        data = serialized_cache.put(cache_key, orjson.dumps({
+            "protocol_id": row.protocol_id,
+            "parent_protocol_id": row.parent_protocol_id,
+            "id": row.id,
+            "protocol": orjson.Fragment(encode_protocol(row, "protocol__")),
+            "fields": row.fields,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+        }))
+
+    return data
@@ -0,0 +1,63 @@
+import xml.etree.ElementTree as ET
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+PD_NS = "http://www.protocoldescription.com"
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+ET.register_namespace("pd", PD_NS)
+
+INFO_KEYS = ["id", "name", "author", "description", "version", "updated_at", "created_at"]
+
+
+def pd(name: str) -> str:
+    return f"{{{PD_NS}}}{name}"
+
+
+def svg(name: str) -> str:
+    return f"{{{SVG_NS}}}{name}"
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_field(element: ET.Element) -> dict:
+    """Read a pd:field element the same way the frontend's getMetadata() does."""
+    return {
+        "id": element.get(pd("id"), ""),
+        "display_name": element.get(pd("display_name"), ""),
+        "length": _int(element.get(pd("length"))),
+        "max_length": _int(element.get(pd("length_max"))),
+        "is_variable_length": element.get(pd("length")) == "0" or element.get(pd("length_max")) is not None,
+        "length_unit": "bytes" if element.get(pd("length_unit")) == "bytes" else "bits",
+        "endian": "little" if element.get(pd("endian")) == "little" else "big",
+        "description": element.get(pd("description"), ""),
+        "encapsulate": element.get(pd("encapsulate")) == "true",
+        "group_id": element.get(pd("group_id")),
+        "field_options": [
+            {"name": option.get(pd("name"), ""), "value": _int(option.get(pd("value")))}
+            for option in element.iter(pd("option"))
+        ],
+    }
+
+
+def parse_metadata(data: bytes) -> dict:
+    """Extract pd:info and the pd:field list from a protocol SVG."""
+    root = ET.fromstring(data)
+
+    info = {}
+    info_element = root.find(f".//{pd('info')}")
+
+    if info_element is not None:
+        for key in INFO_KEYS:
+            child = info_element.find(pd(key))
+            info[key] = (child.text or "") if child is not None else ""
+
+    fields = [parse_field(element) for element in root.iter(pd("field"))]
+
+    return {"info": info, "fields": fields}
@@ -0,0 +1,83 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+from src.svg.metadata import PD_NS, SVG_NS, XLINK_NS
+from src.svg.pool import run_in_pool
+
+# Elements whose text content is rendered and must be kept as-is
+TEXT_ELEMENTS = {f"{{{SVG_NS}}}text", f"{{{SVG_NS}}}tspan", f"{{{SVG_NS}}}title", f"{{{SVG_NS}}}desc"}
+
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# ElementTree can't serialize with these prefixes, documents using them get generated ones
+RESERVED_PREFIX = re.compile(r"ns\d+$")
+
+CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+CSS_WHITESPACE = re.compile(r"\s*([{}:;,>])\s*")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _minify_css(css: str) -> str:
+    css = CSS_COMMENT.sub("", css)
+    css = WHITESPACE.sub(" ", css)
+    css = CSS_WHITESPACE.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def _minify_style_attribute(style: str) -> str:
+    return _minify_css(style).rstrip(";")
+
+
+def _optimize_element(element: ET.Element, seen_styles: set, in_text: bool = False):
+    # Whitespace is significant in the whole subtree, keep it exactly as it is
+    if element.get(XML_SPACE) == "preserve":
+        return
+
+    # Leaf pd: elements carry metadata values, keep their text even if it is only whitespace
+    is_pd_leaf = element.tag.startswith(f"{{{PD_NS}}}") and len(element) == 0
+    is_text = element.tag in TEXT_ELEMENTS
+
+    if element.tag == f"{{{SVG_NS}}}style" and element.text:
+        element.text = _minify_css(element.text)
+    elif not is_pd_leaf and not is_text and element.text and not element.text.strip():
+        element.text = None
+
+    # Inside text elements the whitespace between tspans is rendered, e.g. <tspan>Source</tspan> <tspan>Port</tspan>
+    if not in_text and element.tail and not element.tail.strip():
+        element.tail = None
+
+    if "style" in element.attrib:
+        element.attrib["style"] = _minify_style_attribute(element.attrib["style"])
+
+    for child in list(element):
+        # Drop repeated inline <style> blocks, the first one already applies document-wide
+        if child.tag == f"{{{SVG_NS}}}style":
+            key = _minify_css(child.text or "")
+            if key in seen_styles:
+                element.remove(child)
+                continue
+            seen_styles.add(key)
+
+        _optimize_element(child, seen_styles, is_text)
+
+
+def optimize_svg(data: bytes) -> bytes:
+    """Minify an SVG document, leaving the pd: metadata untouched apart from indentation."""
+    # ElementTree drops comments and processing instructions while parsing
+    root = ET.fromstring(data)
+
+    _optimize_element(root, set())
+
+    # Keep the document's own prefixes (inkscape:, sodipodi:, ...) instead of ns0:, ns1:, ...
+    # Registration is global, but every document registers its prefixes again right before it is written.
+    for _, (prefix, uri) in ET.iterparse(io.BytesIO(data), events=["start-ns"]):
+        if prefix and prefix not in ("xlink", "pd") and uri not in (SVG_NS, XLINK_NS, PD_NS) and not RESERVED_PREFIX.match(prefix):
+            ET.register_namespace(prefix, uri)
+
+    return ET.tostring(root, encoding="utf-8", xml_declaration=False)
+
+
+async def optimize_svg_async(data: bytes) -> bytes:
+    """Run optimize_svg in the process pool so large uploads don't block the event loop."""
+    return await run_in_pool(optimize_svg, data)
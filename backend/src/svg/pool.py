@@ -0,0 +1,21 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from src.config import settings
+
+_executor = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.SVG_PROCESS_WORKERS)
+
+    return _executor
+
+
+async def run_in_pool(func, *args):
+    """Run a CPU-bound SVG job in the process pool so it doesn't block the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), func, *args)
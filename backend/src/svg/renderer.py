@@ -0,0 +1,297 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import settings
+from src.file_cache import prune_cache_dir, touch_cached
+from src.svg.metadata import INFO_KEYS, pd, svg
+from src.svg.pool import run_in_pool
+
+# Bump whenever the rendered output changes, so stale cache entries are not served
+RENDERER_VERSION = 1
+
+LINE_HEIGHT_PX = 40
+
+STYLE = (
+    "rect.field{fill:rgb(255,255,255);stroke-width:2;stroke:rgb(0,0,0)}"
+    "text.fieldText{font-family:Verdana;font-size:14px;fill:black;text-anchor:middle;dominant-baseline:middle}"
+)
+
+# Same palette as frontend/src/utils/groupUtils.ts
+PREDEFINED_GROUP_COLORS = {
+    "header": "#2196F3",
+    "payload": "#4CAF50",
+    "footer": "#FF9800",
+    "control": "#9C27B0",
+    "address": "#F44336",
+    "checksum": "#795548",
+    "flags": "#607D8B",
+    "length": "#FFC107",
+}
+
+
+def generate_group_color(group_id: str) -> str:
+    if group_id in PREDEFINED_GROUP_COLORS:
+        return PREDEFINED_GROUP_COLORS[group_id]
+
+    # Port of the 32-bit string hash used by the frontend, so both sides pick the same hue
+    hash_value = 0
+    for char in group_id:
+        hash_value = ((hash_value << 5) - hash_value + ord(char)) & 0xFFFFFFFF
+    if hash_value >= 0x80000000:
+        hash_value -= 0x100000000
+
+    hue = abs(hash_value) % 360
+    saturation, lightness = 70, 0.5
+    a = saturation * min(lightness, 1 - lightness) / 100
+
+    def channel(n):
+        k = (n + hue / 30) % 12
+        color = lightness - a * max(min(k - 3, 9 - k, 1), -1)
+        return f"{round(255 * color):02x}"
+
+    return f"#{channel(0)}{channel(8)}{channel(4)}"
+
+
+def hex_to_rgba(hex_color: str, opacity: float) -> str:
+    rgb = hex_color.lstrip("#")
+    return f"rgba({int(rgb[0:2], 16)}, {int(rgb[2:4], 16)}, {int(rgb[4:6], 16)}, {opacity})"
+
+
+def _bits(field: dict, key: str) -> int:
+    value = field.get(key) or 0
+    return value * 8 if field.get("length_unit") == "bytes" else value
+
+
+def _field_width(field: dict, options: dict, rendered_in_line: int) -> int:
+    row_width = options["bits_per_row"] * options["pixels_per_bit"]
+
+    if not field.get("is_variable_length"):
+        return _bits(field, "length") * options["pixels_per_bit"]
+
+    # Variable length without a known maximum stretches to the end of the line
+    if not field.get("max_length"):
+        return row_width - rendered_in_line
+
+    if not options["truncate_variable_length_fields"]:
+        return _bits(field, "max_length") * options["pixels_per_bit"]
+
+    field_width = max(_bits(field, "length"), _bits(field, "max_length")) * options["pixels_per_bit"]
+
+    return row_width - rendered_in_line if row_width < field_width else field_width
+
+
+def _render_metadata(parent: ET.Element, info: dict, fields: list[dict]):
+    metadata = ET.SubElement(parent, svg("metadata"))
+    info_element = ET.SubElement(metadata, pd("info"))
+
+    for key in INFO_KEYS:
+        ET.SubElement(info_element, pd(key)).text = str(info.get(key, ""))
+
+    for field in fields:
+        element = ET.SubElement(metadata, pd("field"))
+        element.set(pd("display_name"), field["display_name"])
+        element.set(pd("id"), field["id"])
+        element.set(pd("length"), str(field.get("length", 0)))
+        element.set(pd("length_unit"), field.get("length_unit") or "bits")
+
+        if field.get("is_variable_length"):
+            element.set(pd("length_max"), str(field.get("max_length") or 0))
+        if field.get("endian"):
+            element.set(pd("endian"), field["endian"])
+        if field.get("description"):
+            element.set(pd("description"), field["description"])
+        if field.get("encapsulate"):
+            element.set(pd("encapsulate"), "true")
+        if field.get("group_id"):
+            element.set(pd("group_id"), field["group_id"])
+            element.set(pd("group_color"), generate_group_color(field["group_id"]))
+
+        for option in field.get("field_options") or []:
+            option_element = ET.SubElement(element, pd("option"))
+            option_element.set(pd("name"), str(option["name"]))
+            option_element.set(pd("value"), str(option["value"]))
+
+
+def _render_scale(parent: ET.Element, options: dict):
+    scale = ET.SubElement(parent, svg("g"), {"transform": "translate(0,0)", "data-scale": "true"})
+
+    if not options["show_scale"]:
+        return
+
+    width = options["bits_per_row"] * options["pixels_per_bit"]
+
+    scale_svg = ET.SubElement(scale, svg("svg"), {"width": str(width), "height": str(LINE_HEIGHT_PX)})
+    marker = ET.SubElement(ET.SubElement(scale_svg, svg("defs")), svg("marker"), {
+        "id": "arrow", "viewBox": "0 0 10 10", "refX": "10", "refY": "5",
+        "markerWidth": "6", "markerHeight": "6", "orient": "auto-start-reverse",
+    })
+    ET.SubElement(marker, svg("path"), {
+        "d": "M 0 0 L 10 5 L 0 10", "fill": "transparent", "stroke": "black", "stroke-width": "2px",
+    })
+    ET.SubElement(ET.SubElement(scale_svg, svg("g"), {"transform": "translate(0, 20)"}), svg("line"), {
+        "x1": "0", "y1": "0", "x2": "100%", "y2": "0", "stroke": "black", "stroke-width": "2",
+        "marker-end": "url(#arrow)", "marker-start": "url(#arrow)",
+    })
+    ET.SubElement(scale_svg, svg("rect"), {
+        "x": str(width // 2 - 50), "y": "0", "height": "40", "width": "100", "fill": "rgb(255,255,255)",
+    })
+    ET.SubElement(scale_svg, svg("text"), {"x": "50%", "y": "50%", "class": "fieldText"}).text = f"{options['bits_per_row']} bits"
+
+
+class RenderTooLarge(ValueError):
+    pass
+
+
+def _render_table(parent: ET.Element, fields: list[dict], options: dict) -> int:
+    """
+    Lay fields out in rows like the frontend's renderSVG() and return the table height. Raises RenderTooLarge
+    past RENDER_MAX_ROWS rows, a long field on a narrow row would otherwise produce an element per row.
+    """
+    row_width = options["bits_per_row"] * options["pixels_per_bit"]
+    offset = LINE_HEIGHT_PX if options["show_scale"] else 0
+
+    table = ET.SubElement(parent, svg("g"), {"transform": f"translate(0, {offset})", "data-table": "true"})
+
+    wrapper = None
+    wrapper_height = 0
+    inner_height = 0
+    inner_width = 0
+    rendered_in_line = 0
+    rows = 1
+
+    for field in fields:
+        remaining = _field_width(field, options, rendered_in_line)
+
+        if rendered_in_line == 0:
+            wrapper_height += inner_height
+            wrapper = ET.SubElement(table, svg("g"), {"transform": f"translate(0, {wrapper_height})"})
+            inner_height = 0
+
+        label = f"{field['display_name']} ..." if field.get("is_variable_length") else field["display_name"]
+        fill = hex_to_rgba(generate_group_color(field["group_id"]), 0.08) if field.get("group_id") else None
+
+        while True:
+            width = min(remaining, row_width - rendered_in_line)
+
+            element = ET.SubElement(wrapper, svg("g"), {
+                "transform": f"translate({inner_width}, {inner_height})",
+                "data-id": field["id"],
+                "class": "dataElement",
+            })
+            rect = ET.SubElement(element, svg("rect"), {"class": "field", "width": str(width), "height": str(LINE_HEIGHT_PX)})
+            if fill:
+                rect.set("style", f"fill: {fill}")
+                rect.set("data-original-style-fill", fill)
+
+            text_svg = ET.SubElement(element, svg("svg"), {"width": str(width), "height": str(LINE_HEIGHT_PX)})
+            ET.SubElement(text_svg, svg("text"), {"x": "50%", "y": "50%", "class": "fieldText"}).text = label
+
+            rendered_in_line += width
+
+            if rendered_in_line >= row_width:
+                rows += 1
+                if rows > settings.RENDER_MAX_ROWS:
+                    raise RenderTooLarge(f"more than {settings.RENDER_MAX_ROWS} rows")
+
+                rendered_in_line = 0
+                inner_width = 0
+                inner_height += LINE_HEIGHT_PX
+            else:
+                inner_width += width
+
+            remaining -= width
+
+            # A field that wraps onto the next row stays inside the current row wrapper
+            if remaining <= 0:
+                break
+
+    return wrapper_height + inner_height + (LINE_HEIGHT_PX if rendered_in_line else 0)
+
+
+def render_protocol_svg(info: dict, fields: list[dict], options: dict) -> bytes:
+    """Render a protocol diagram, including its pd: metadata, from a field list."""
+    root = ET.Element(svg("svg"))
+
+    _render_metadata(root, info, fields)
+    ET.SubElement(root, svg("style")).text = STYLE
+    _render_scale(root, options)
+    table_height = _render_table(root, fields, options)
+
+    # Mirrors setSvgSize(), which sizes the document to its bounding box plus one pixel
+    scale_height = LINE_HEIGHT_PX if options["show_scale"] else 0
+    root.set("width", str(options["bits_per_row"] * options["pixels_per_bit"] + 1))
+    root.set("height", str(scale_height + table_height + 1))
+
+    return ET.tostring(root, encoding="utf-8")
+
+
+def render_cache_key(info: dict, fields: list[dict], options: dict) -> str:
+    payload = json.dumps(
+        {"version": RENDERER_VERSION, "info": info, "fields": fields, "options": options},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_cache_path(key: str, protocol_id=None) -> str:
+    # Renders of a stored protocol are prefixed with its id, so they can be dropped when it changes
+    name = f"{protocol_id}.{key}.svg" if protocol_id is not None else f"{key}.svg"
+    return os.path.join(settings.RENDER_CACHE_DIR, name)
+
+
+def invalidate_protocol_renders(protocol_id):
+    """Remove the cached renders of a protocol whose SVG was replaced or which was deleted."""
+    for path in glob.glob(os.path.join(settings.RENDER_CACHE_DIR, f"{protocol_id}.*.svg")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_render_cache(max_bytes: int):
+    """Remove the least recently used renders until the cache fits in max_bytes."""
+    prune_cache_dir(settings.RENDER_CACHE_DIR, max_bytes, ".svg")
+
+
+_last_prune = 0.0
+
+
+async def _maybe_prune():
+    # Scanning the cache is cheap but not free, every process does it at most once per interval
+    global _last_prune
+
+    if time.monotonic() - _last_prune < settings.RENDER_CACHE_PRUNE_INTERVAL:
+        return
+
+    _last_prune = time.monotonic()
+    await run_in_threadpool(prune_render_cache, settings.RENDER_CACHE_MAX_BYTES)
+
+
+async def render_protocol_svg_cached(info: dict, fields: list[dict], options: dict, protocol_id=None) -> str:
+    """Return the path of the rendered SVG, rendering it only on a cache miss."""
+    path = render_cache_path(render_cache_key(info, fields, options), protocol_id)
+
+    if touch_cached(path):
+        return path
+
+    rendered = await run_in_pool(render_protocol_svg, info, fields, options)
+
+    os.makedirs(settings.RENDER_CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary file first so concurrent readers never see a partial render
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(rendered)
+    os.replace(tmp_path, path)
+
+    await _maybe_prune()
+
+    return path
@@ -0,0 +1,76 @@
+import io
+import os
+from functools import lru_cache
+
+from lxml import etree
+
+from src.svg.metadata import PD_NS, SVG_NS
+from src.svg.pool import run_in_pool
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "pdschema.xsd")
+
+# Only these pd: elements are global in the schema, pd:option is validated as part of its pd:field
+VALIDATED_ELEMENTS = {f"{{{PD_NS}}}info", f"{{{PD_NS}}}field"}
+METADATA = f"{{{SVG_NS}}}metadata"
+
+
+@lru_cache(maxsize=None)
+def get_schema() -> etree.XMLSchema:
+    """Compiled once per process, the pool workers each keep their own copy."""
+    return etree.XMLSchema(etree.parse(SCHEMA_PATH))
+
+
+def _error(message: str, line=None, element=None, field_id=None) -> dict:
+    return {"message": message, "line": line, "element": element, "field_id": field_id}
+
+
+def _element_name(element) -> str:
+    return etree.QName(element).localname
+
+
+def validate_svg(data: bytes) -> list[dict]:
+    """
+    Validate the pd: metadata of a protocol SVG against pdschema.xsd and return the errors found.
+    The document is parsed incrementally and parsing stops at </metadata>, the drawing is never read.
+    """
+    schema = get_schema()
+    errors = []
+    has_info = False
+
+    parser = etree.iterparse(
+        io.BytesIO(data),
+        events=("start", "end"),
+        resolve_entities=False,
+        no_network=True,
+        load_dtd=False,
+    )
+
+    try:
+        for event, element in parser:
+            if event == "start":
+                if element.getparent() is None and element.tag != f"{{{SVG_NS}}}svg":
+                    return [_error("Root element must be an SVG <svg> element", element.sourceline, _element_name(element))]
+                continue
+
+            if element.tag in VALIDATED_ELEMENTS:
+                has_info = has_info or element.tag == f"{{{PD_NS}}}info"
+
+                if not schema.validate(element):
+                    for entry in schema.error_log:
+                        errors.append(_error(entry.message, element.sourceline, f"pd:{_element_name(element)}", element.get(f"{{{PD_NS}}}id")))
+
+            elif element.tag == METADATA:
+                break
+        else:
+            return [_error("Missing <metadata> element with the protocol description")]
+    except etree.XMLSyntaxError as e:
+        return [_error(f"Malformed XML: {e.msg}", e.lineno)]
+
+    if not has_info:
+        errors.append(_error("Missing pd:info element", element="metadata"))
+
+    return errors
+
+
+async def validate_svg_async(data: bytes) -> list[dict]:
+    return await run_in_pool(validate_svg, data)
@@ -0,0 +1,169 @@
+"""
+Tests run against a real Postgres, configured with the usual DATABASE_* variables. The database named
+in DATABASE_NAME (protocol_designer_test by default) is dropped and migrated from scratch for every run.
+Tests that need the database are skipped when Postgres can't be reached.
+
+    cd backend && DATABASE_HOST=localhost DATABASE_PASSWORD=... python -m pytest tests
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("DATABASE_HOST", "localhost")
+os.environ.setdefault("DATABASE_PORT", "5432")
+os.environ.setdefault("DATABASE_NAME", "protocol_designer_test")
+os.environ.setdefault("DATABASE_USER", "postgres")
+os.environ.setdefault("DATABASE_PASSWORD", "root")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("CATALOG_DIR", os.path.join(BACKEND_DIR, "catalog"))
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory):
+    """static/ and the caches below it are relative to the working directory, keep them out of the tree."""
+    path = tmp_path_factory.mktemp("workdir")
+    os.makedirs(path / "static")
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+
+def _admin_connection():
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+    connection = psycopg2.connect(
+        host=os.environ["DATABASE_HOST"], port=os.environ["DATABASE_PORT"], dbname="postgres",
+        user=os.environ["DATABASE_USER"], password=os.environ["DATABASE_PASSWORD"], connect_timeout=3,
+    )
+    connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    return connection
+
+
+def recreate_database(name: str):
+    """Drop and create an empty database, skips the test when Postgres can't be reached."""
+    import psycopg2
+
+    try:
+        connection = _admin_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        cursor.execute(f'CREATE DATABASE "{name}" ENCODING \'UTF8\' TEMPLATE template0')
+    connection.close()
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+
+    return config
+
+
+@pytest.fixture(scope="session")
+def database(workdir):
+    from alembic import command
+
+    recreate_database(os.environ["DATABASE_NAME"])
+
+    config = alembic_config()
+    command.upgrade(config, "head")
+
+    return config
+
+
+@pytest.fixture(scope="session")
+def app(database):
+    from src.__main__ import app
+
+    return app
+
+
+@pytest.fixture
+def db(database):
+    from src.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def catalog(database):
+    """Publishes the catalog in CATALOG_DIR once, returns the summary of that run."""
+    from src.crud.catalog import publish_catalog
+    from src.database import SessionLocal
+
+    session = SessionLocal()
+
+    try:
+        return publish_catalog(session)
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_client(app):
+    """
+    Returns a function creating a test client logged in as a new user. Clients are not entered, so the
+    startup handlers don't run and the change feed isn't listening, tests of the feed start it themselves.
+    """
+    from fastapi.testclient import TestClient
+
+    def make(admin: bool = False):
+        client = TestClient(app)
+
+        email = f"user-{uuid.uuid4().hex[:12]}@example.com"
+        response = client.post("/register", json={"email": email, "name": "Test", "password": "password123"})
+        assert response.status_code == 200, response.text
+        client.user = response.json()
+
+        if admin:
+            from src.database import SessionLocal
+            from src.models import User
+
+            session = SessionLocal()
+            session.query(User).filter(User.id == client.user["id"]).update({"is_admin": True})
+            session.commit()
+            session.close()
+
+        response = client.post("/login", data={"username": email, "password": "password123"})
+        assert response.status_code == 200, response.text
+
+        return client
+
+    return make
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+def example_svg(name: str) -> bytes:
+    with open(os.path.join(os.environ["CATALOG_DIR"], name), "rb") as f:
+        return f.read()
+
+
+def create_protocol(client, name: str = "Test protocol", svg: bytes = None) -> dict:
+    response = client.post("/protocols", json={"name": name, "author": "Tester", "version": "1.0", "description": f"{name} description"})
+    assert response.status_code == 201, response.text
+    protocol = response.json()
+
+    if svg is not None:
+        response = client.post(f"/protocols/{protocol['id']}/upload", files={"file": ("protocol.svg", svg, "image/svg+xml")})
+        assert response.status_code == 200, response.text
+
+    return protocol
@@ -0,0 +1,42 @@
+import os
+import sys
+
+from sqlalchemy import text
+
+
+def _run(monkeypatch, module, *args):
+    monkeypatch.setattr(sys, "argv", [module.__name__, *args])
+    return module.main()
+
+
+def test_generate_and_run(database, app, db, monkeypatch, capsys):
+    from benchmarks import generate, run
+
+    _run(monkeypatch, generate, "--users", "2", "--protocols", "6", "--depth", "3", "--width", "2", "--fan-in", "1")
+    assert "Generated 2 users, 12 protocols" in capsys.readouterr().out
+
+    sessions = run.pick_sessions(5)
+    assert len(sessions) == 2
+
+    for email, protocol_id, leaf_id in sessions:
+        # The leaf is the protocol with the most ancestors in the user's library
+        depths = dict(db.execute(text("""
+            SELECT p.id::text, count(c.ancestor_id) FROM protocols p
+            JOIN users u ON u.id = p.user_id
+            LEFT JOIN protocol_encapsulation_closure c ON c.descendant_id = p.id
+            WHERE u.email = :email GROUP BY p.id
+        """), {"email": email}).all())
+
+        assert depths[leaf_id] == max(depths.values())
+        assert protocol_id == min(depths)
+
+    protocols = db.execute(text("SELECT count(*) FROM protocols")).scalar()
+    static = set(os.listdir("static"))
+
+    _run(monkeypatch, run, "--scenarios", "read_protocols", "tree", "upload", "--requests", "4", "--concurrency", "2")
+    output = capsys.readouterr().out
+    assert "errors 0" in output and "errors 1" not in output
+
+    # The upload scenario worked on scratch protocols, which are gone again with their SVGs
+    assert db.execute(text("SELECT count(*) FROM protocols")).scalar() == protocols
+    assert set(os.listdir("static")) == static
@@ -0,0 +1,36 @@
+from src.crud.catalog import catalog_protocol_id, publish_catalog
+from tests.conftest import create_protocol
+
+
+def test_read_catalog(client, catalog):
+    listing = client.get("/catalog").json()
+    assert {protocol["catalog_slug"] for protocol in listing} >= {"ethernet-ii", "ipv4", "tcp", "udp"}
+
+    [ipv4] = client.get("/catalog/ipv4").json()
+    assert ipv4["id"] == str(catalog_protocol_id("ipv4", "1.0"))
+    assert client.get("/catalog/ipv4/1.0").json() == ipv4
+
+    assert client.get("/catalog/missing").status_code == 404
+    assert client.get("/catalog/ipv4/9.9").status_code == 404
+
+
+def test_publish_is_idempotent(catalog, db):
+    assert publish_catalog(db) == {"protocols": 0, "encapsulations": 0}
+
+
+def test_encapsulate_in_catalog(client, make_client, catalog):
+    ipv4 = client.get("/catalog/ipv4/1.0").json()
+    protocol = create_protocol(client, "SCTP")
+
+    response = client.post("/protocol-encapsulations", json={"protocol_id": protocol["id"], "parent_protocol_id": ipv4["id"]})
+    assert response.status_code == 201, response.text
+
+    ancestors = client.get(f"/protocol-encapsulations/{protocol['id']}/ancestors").json()
+    assert {item["catalog_slug"] for item in ancestors} == {"ipv4", "ethernet-ii"}
+
+    # Catalog protocols are read only, and another user's encapsulations in them stay private
+    assert client.delete(f"/protocols/{ipv4['id']}").status_code == 404
+
+    other = make_client()
+    children = other.get(f"/protocol-encapsulations/{ipv4['id']}").json()
+    assert protocol["id"] not in {item["protocol"]["id"] for item in children}
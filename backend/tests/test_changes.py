@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from tests.conftest import create_protocol
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def _changes(event: str) -> list[dict]:
+    data = next(line for line in event.splitlines() if line.startswith("data: "))
+    return json.loads(data[len("data: "):])
+
+
+def test_replay_changes(client):
+    from src.crud.changes import replay_changes
+
+    user_id = client.user["id"]
+    start, backlog = replay_changes(user_id, None)
+    assert backlog == []
+
+    protocol = create_protocol(client, "Replayed")
+    client.put(f"/protocols/{protocol['id']}", json={**protocol, "name": "Renamed"})
+
+    seq, changes = replay_changes(user_id, start)
+    assert seq == start
+    assert [(change["kind"], change["protocol_id"]) for change in changes] == [("created", protocol["id"]), ("updated", protocol["id"])]
+    assert changes[0]["seq"] < changes[1]["seq"]
+
+    # A new stream starts after the latest change
+    assert replay_changes(user_id, None) == (changes[-1]["seq"], [])
+
+
+def test_prune_changes(client, db):
+    from src.crud.changes import prune_changes, replay_changes
+
+    user_id = client.user["id"]
+    create_protocol(client, "Old")
+    create_protocol(client, "Older")
+    latest, _ = replay_changes(user_id, None)
+
+    db.execute(text("UPDATE protocol_changes SET created_at = now() - interval '30 days'"))
+    db.commit()
+
+    prune_changes(7)
+
+    assert db.execute(text("SELECT array_agg(seq) FROM protocol_changes")).scalar() == [latest]
+
+    # Clients from before the pruned changes have to reload, clients that saw the latest one carry on
+    assert replay_changes(user_id, 0) == (0, None)
+    assert replay_changes(user_id, latest - 1)[1] is not None
+    assert replay_changes(user_id, latest) == (latest, [])
+
+
+def test_stream_changes(client, monkeypatch):
+    from src.changefeed import change_feed
+    from src.endpoints import changes as endpoint
+
+    monkeypatch.setattr(endpoint, "KEEPALIVE_INTERVAL", 0.2)
+    user_id = client.user["id"]
+
+    async def next_changes(stream):
+        while True:
+            event = await asyncio.wait_for(stream.__anext__(), 10)
+            if event.startswith("id: "):
+                return _changes(event)
+
+    async def main():
+        change_feed.start()
+
+        try:
+            for _ in range(100):
+                if change_feed.connection is not None:
+                    break
+                await asyncio.sleep(0.05)
+
+            # Nothing is subscribed until the stream runs, a client gone before that leaves nothing behind
+            stream = endpoint.stream_changes(ConnectedRequest(), user_id, None)
+            assert user_id not in change_feed.subscriptions
+
+            pending = asyncio.ensure_future(next_changes(stream))
+            await asyncio.sleep(0.3)
+            assert len(change_feed.subscriptions[user_id]) == 1
+
+            protocol = await run_in_threadpool(create_protocol, client, "Streamed")
+            changes = await pending
+            assert [(change["kind"], change["protocol_id"]) for change in changes] == [("created", protocol["id"])]
+
+            # Notifications lost while the listener was away are replayed from the log
+            change_feed._disconnect()
+            protocol = await run_in_threadpool(create_protocol, client, "Missed")
+            [subscription] = change_feed.subscriptions[user_id]
+            subscription.missed = True
+
+            changes = await next_changes(stream)
+            assert [(change["kind"], change["protocol_id"]) for change in changes] == [("created", protocol["id"])]
+
+            await stream.aclose()
+            assert user_id not in change_feed.subscriptions
+        finally:
+            change_feed.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+import os
+
+from tests.conftest import create_protocol, example_svg
+
+
+def _stack(client):
+    ethernet = create_protocol(client, "Ethernet II", example_svg("ethII/Ethernet II.svg"))
+    ipv4 = create_protocol(client, "IPv4", example_svg("ipv4/IPv4.svg"))
+    response = client.post("/protocol-encapsulations", json={"protocol_id": ipv4["id"], "parent_protocol_id": ethernet["id"]})
+    assert response.status_code == 201, response.text
+
+    return ethernet, ipv4
+
+
+def test_generate_code(client):
+    _, ipv4 = _stack(client)
+
+    response = client.get(f"/protocols/{ipv4['id']}/codegen/c")
+    assert response.status_code == 200, response.text
+    assert "IPv4 protocol stack" in response.text
+
+    # The second request is a cache hit with the same artifact
+    assert client.get(f"/protocols/{ipv4['id']}/codegen/c").text == response.text
+
+    response = client.get(f"/protocols/{ipv4['id']}/codegen/lua")
+    assert response.status_code == 200, response.text
+
+
+def test_code_cache_is_pruned(client, monkeypatch):
+    from src.codegen import generator
+    from src.config import settings
+
+    _, ipv4 = _stack(client)
+
+    monkeypatch.setattr(settings, "CODEGEN_CACHE_MAX_BYTES", 1)
+    monkeypatch.setattr(generator, "_last_prune", 0.0)
+
+    paths = []
+
+    for udp_port in [1000, 1001, 1002]:
+        response = client.get(f"/protocols/{ipv4['id']}/codegen/lua", params={"udp_port": udp_port})
+        assert response.status_code == 200, response.text
+        monkeypatch.setattr(generator, "_last_prune", 0.0)
+
+        # Artifacts are only pruned once they haven't been used for a while
+        path = max((os.path.join(settings.CODEGEN_CACHE_DIR, name) for name in os.listdir(settings.CODEGEN_CACHE_DIR)), key=os.path.getmtime)
+        os.utime(path, (1, 1))
+        paths.append(path)
+
+    # Each artifact is over the limit and removed by the prune after the next one was written
+    assert [os.path.exists(path) for path in paths] == [False, False, True]
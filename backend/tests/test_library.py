@@ -0,0 +1,87 @@
+import io
+import json
+import tarfile
+
+from tests.conftest import create_protocol, example_svg
+
+FIELDS = [{"id": "ethertype", "field_options": [{"name": "IPv4", "value": 2048, "used_for_encapsulation": True}]}]
+
+
+def _export(client) -> dict:
+    response = client.get("/library/export")
+    assert response.status_code == 200, response.text
+
+    members = {"protocols": [], "encapsulations": [], "svg": []}
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        for member in archive:
+            kind = member.name.split("/")[0]
+            data = archive.extractfile(member).read()
+
+            if kind == "svg":
+                members["svg"].append(member.name)
+            elif kind in members:
+                members[kind] += [json.loads(line) for line in data.splitlines()]
+
+    members["archive"] = response.content
+
+    return members
+
+
+def _import(client, archive: bytes) -> dict:
+    response = client.post("/library/import", files={"file": ("library.tar", archive, "application/x-tar")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _library(client):
+    ethernet = create_protocol(client, "Ethernet II", example_svg("ethII/Ethernet II.svg"))
+    ipv4 = create_protocol(client, "IPv4", example_svg("ipv4/IPv4.svg"))
+
+    encapsulation = client.post("/protocol-encapsulations", json={"protocol_id": ipv4["id"], "parent_protocol_id": ethernet["id"]}).json()
+    response = client.put(f"/protocol-encapsulations/{encapsulation['id']}", json={"fields": json.dumps(FIELDS)})
+    assert response.status_code == 200, response.text
+
+    return ethernet, ipv4
+
+
+def test_export_round_trip_keeps_fields(client):
+    _library(client)
+    exported = _export(client)
+
+    assert [row["fields"] for row in exported["encapsulations"]] == [FIELDS]
+
+    # Importing into the same library keeps everything as it is
+    summary = _import(client, exported["archive"])
+    assert summary["protocols"] == 0 and summary["encapsulations"] == 0 and summary["remapped"] == 0
+
+    assert _export(client)["encapsulations"] == exported["encapsulations"]
+
+
+def test_import_into_another_account_remaps_ids(make_client):
+    owner = make_client()
+    ethernet, ipv4 = _library(owner)
+    exported = _export(owner)
+
+    other = make_client()
+    summary = _import(other, exported["archive"])
+
+    assert summary["protocols"] == 2
+    assert summary["remapped"] == 2
+    assert summary["encapsulations"] == 1
+    assert summary["svgs"] == 4
+
+    imported = _export(other)
+    ids = {protocol["id"] for protocol in imported["protocols"]}
+
+    assert {protocol["name"] for protocol in imported["protocols"]} == {"Ethernet II", "IPv4"}
+    assert not ids & {ethernet["id"], ipv4["id"]}
+    assert len(imported["svg"]) == 4
+
+    [encapsulation] = imported["encapsulations"]
+    assert encapsulation["fields"] == FIELDS
+    assert {encapsulation["protocol_id"], encapsulation["parent_protocol_id"]} == ids
+    assert encapsulation["id"] != exported["encapsulations"][0]["id"]
+
+    # The owner's library is untouched
+    assert _export(owner)["encapsulations"] == exported["encapsulations"]
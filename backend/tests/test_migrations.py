@@ -0,0 +1,49 @@
+import os
+import uuid
+
+from sqlalchemy import create_engine, text
+
+from tests.conftest import alembic_config, example_svg, recreate_database
+
+
+def test_search_migration_backfills_fields(workdir, monkeypatch):
+    from alembic import command
+
+    name = f"{os.environ['DATABASE_NAME']}_migrations"
+    recreate_database(name)
+    monkeypatch.setenv("DATABASE_NAME", name)
+
+    config = alembic_config()
+    command.upgrade(config, "9b2e4c6a1f37")
+
+    engine = create_engine(
+        f"postgresql+psycopg2://{os.environ['DATABASE_USER']}:{os.environ['DATABASE_PASSWORD']}"
+        f"@{os.environ['DATABASE_HOST']}:{os.environ['DATABASE_PORT']}/{name}"
+    )
+    protocol_id = uuid.uuid4()
+
+    with engine.begin() as connection:
+        user_id = connection.execute(text("INSERT INTO users (email, created_at, updated_at) VALUES ('migration@example.com', now(), now()) RETURNING id")).scalar()
+        connection.execute(text("""
+            INSERT INTO protocols (id, user_id, name, author, version, description, created_at, updated_at)
+            VALUES (:id, :user_id, 'IPv4', 'Tester', '1.0', 'IPv4', now(), now())
+        """), {"id": protocol_id, "user_id": user_id})
+
+    with open(f"static/{protocol_id}.svg", "wb") as f:
+        f.write(example_svg("ipv4/IPv4.svg"))
+
+    try:
+        command.upgrade(config, "head")
+
+        with engine.connect() as connection:
+            fields = dict(connection.execute(
+                text("SELECT field_id, display_name FROM protocol_fields WHERE protocol_id = :id AND user_id = :user_id"),
+                {"id": protocol_id, "user_id": user_id},
+            ).all())
+
+        assert fields["ttl"] == "Time to Live"
+        assert len(fields) == 17
+
+        command.downgrade(config, "base")
+    finally:
+        engine.dispose()
@@ -0,0 +1,34 @@
+import os
+
+
+def test_profile_header_value(make_client):
+    from src.config import settings
+
+    admin = make_client(admin=True)
+
+    for value in ["0", "false", ""]:
+        response = admin.get("/protocols", headers={"X-Profile": value})
+        assert response.status_code == 200, response.text
+        assert "x-profile-id" not in response.headers
+
+    response = admin.get("/protocols", headers={"X-Profile": "1"})
+    assert response.status_code == 200, response.text
+    profile_id = response.headers["x-profile-id"]
+
+    for suffix in ["json", "prof"]:
+        assert os.path.exists(os.path.join(settings.PROFILING_DIR, f"{profile_id}.{suffix}"))
+
+    profile = admin.get(f"/profiles/{profile_id}").json()
+    assert profile["path"] == "/protocols"
+    assert profile["sql_count"] > 0
+
+
+def test_profile_requires_admin(make_client):
+    client = make_client()
+
+    response = client.get("/protocols", headers={"X-Profile": "1"})
+    assert response.status_code == 200, response.text
+    assert "x-profile-id" not in response.headers
+
+    response = client.get("/protocols", params={"profile": "1"})
+    assert "x-profile-id" not in response.headers
@@ -0,0 +1,83 @@
+import json
+
+from tests.conftest import create_protocol
+
+FIELDS = [{"id": "ethertype", "field_options": [{"name": "IPv4", "value": 2048, "used_for_encapsulation": True}]}]
+
+
+def test_read_matches_update_response(client):
+    parent = create_protocol(client, "Ethernet II")
+    protocol = create_protocol(client, "IPv4")
+
+    response = client.post("/protocol-encapsulations", json={"protocol_id": protocol["id"], "parent_protocol_id": parent["id"]})
+    assert response.status_code == 201, response.text
+    encapsulation = response.json()
+
+    response = client.put(f"/protocol-encapsulations/{encapsulation['id']}", json={"fields": json.dumps(FIELDS)})
+    assert response.status_code == 200, response.text
+    updated = response.json()
+
+    response = client.get(f"/protocol-encapsulations/{parent['id']}")
+    assert response.status_code == 200, response.text
+
+    assert response.json() == [updated]
+    assert json.loads(updated["fields"]) == FIELDS
+
+    # Served from the serialized cache the second time, the update has to show up right away
+    client.put(f"/protocol-encapsulations/{encapsulation['id']}", json={"fields": json.dumps([])})
+    assert json.loads(client.get(f"/protocol-encapsulations/{parent['id']}").json()[0]["fields"]) == []
+
+
+def test_read_without_fields(client):
+    parent = create_protocol(client, "Ethernet II")
+    protocol = create_protocol(client, "IPv4")
+    client.post("/protocol-encapsulations", json={"protocol_id": protocol["id"], "parent_protocol_id": parent["id"]})
+
+    [encapsulation] = client.get(f"/protocol-encapsulations/{parent['id']}").json()
+
+    assert encapsulation["fields"] is None
+    assert encapsulation["protocol"]["id"] == protocol["id"]
+
+
+def encapsulate(client, protocol: dict, parent: dict):
+    return client.post("/protocol-encapsulations", json={"protocol_id": protocol["id"], "parent_protocol_id": parent["id"]})
+
+
+def test_cycles_are_rejected(client):
+    ethernet = create_protocol(client, "Ethernet II")
+    ipv4 = create_protocol(client, "IPv4")
+    tcp = create_protocol(client, "TCP")
+
+    assert encapsulate(client, ipv4, ethernet).status_code == 201
+    assert encapsulate(client, tcp, ipv4).status_code == 201
+
+    assert encapsulate(client, ethernet, tcp).status_code == 400
+    assert encapsulate(client, ethernet, ethernet).status_code == 400
+
+    # The rejected edges left nothing behind in the closure
+    assert client.get(f"/protocol-encapsulations/{ethernet['id']}/ancestors").json() == []
+
+
+def test_ancestors_and_descendants(client, make_client):
+    ethernet = create_protocol(client, "Ethernet II")
+    ipv4 = create_protocol(client, "IPv4")
+    tcp = create_protocol(client, "TCP")
+    udp = create_protocol(client, "UDP")
+
+    encapsulate(client, ipv4, ethernet)
+    encapsulate(client, tcp, ipv4)
+    encapsulate(client, udp, ipv4)
+
+    ancestors = client.get(f"/protocol-encapsulations/{tcp['id']}/ancestors").json()
+    assert {protocol["id"] for protocol in ancestors} == {ipv4["id"], ethernet["id"]}
+
+    descendants = client.get(f"/protocol-encapsulations/{ethernet['id']}/descendants").json()
+    assert {protocol["id"] for protocol in descendants} == {ipv4["id"], tcp["id"], udp["id"]}
+
+    # Removing an edge drops every path through it
+    [edge] = client.get(f"/protocol-encapsulations/{ethernet['id']}").json()
+    assert client.delete(f"/protocol-encapsulations/{edge['id']}").status_code == 200
+    assert client.get(f"/protocol-encapsulations/{ethernet['id']}/descendants").json() == []
+
+    other = make_client()
+    assert other.get(f"/protocol-encapsulations/{tcp['id']}/ancestors").status_code == 404
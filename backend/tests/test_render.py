@@ -0,0 +1,53 @@
+from tests.conftest import create_protocol, example_svg
+
+PROTOCOL = {"name": "Test", "author": "Tester", "version": "1.0", "description": "Test protocol"}
+
+
+def _field(field_id: str, length: int, **kwargs) -> dict:
+    return {"id": field_id, "display_name": field_id, "length": length, **kwargs}
+
+
+def test_render_protocol(client):
+    protocol = create_protocol(client, "IPv4", example_svg("ipv4/IPv4.svg"))
+
+    response = client.get(f"/protocols/{protocol['id']}/render")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    assert b'data-id="version"' in response.content
+
+    # Served from the render cache the second time
+    assert client.get(f"/protocols/{protocol['id']}/render").content == response.content
+
+
+def test_render_wraps_fields():
+    from src.svg.renderer import render_protocol_svg
+
+    options = {"bits_per_row": 32, "pixels_per_bit": 10, "show_scale": False, "truncate_variable_length_fields": True}
+    rendered = render_protocol_svg(PROTOCOL, [_field("a", 16), _field("b", 32), _field("c", 16)], options)
+
+    # b is split across the first and second row
+    assert rendered.count(b'data-id="b"') == 2
+    assert b'height="81"' in rendered
+
+
+def test_render_rejects_field_lengths_out_of_range(client):
+    for length in [-1, 10**9]:
+        response = client.post("/render", json={"protocol": PROTOCOL, "fields": [_field("payload", length)]})
+        assert response.status_code == 400, response.text
+
+
+def test_render_refuses_too_many_rows(client):
+    from src.config import settings
+
+    response = client.post("/render", json={
+        "protocol": PROTOCOL,
+        "fields": [_field("payload", 65536, length_unit="bytes")],
+        "options": {"bits_per_row": 1},
+    })
+
+    assert response.status_code == 400, response.text
+    assert "too large" in response.text
+
+    fields = [_field("payload", settings.RENDER_MAX_ROWS - 1)]
+    response = client.post("/render", json={"protocol": PROTOCOL, "fields": fields, "options": {"bits_per_row": 1}})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,58 @@
+from tests.conftest import create_protocol, example_svg
+
+
+def _search(client, query: str, **params) -> dict:
+    response = client.get("/search", params={"q": query, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_own_protocols(make_client):
+    client = make_client()
+    other = make_client()
+
+    protocol = create_protocol(client, "Zanzibar Transport", example_svg("udp/UDP.svg"))
+    create_protocol(other, "Zanzibar Tunnel")
+
+    page = _search(client, "zanzibar")
+    assert page["total"] == 1
+    assert [item["id"] for item in page["items"]] == [protocol["id"]]
+
+    # Fields of the uploaded SVG are searchable too, the catalog has checksums of its own once it is published
+    [item] = [item for item in _search(client, "checksum")["items"] if item["user_id"] is not None]
+    assert item["id"] == protocol["id"]
+    assert "checksum" in item["matched_fields"]
+
+
+def test_search_catalog(client, catalog):
+    page = _search(client, "ipv4")
+    assert any(item["catalog_slug"] == "ipv4" and item["user_id"] is None for item in page["items"])
+
+    # Catalog fields are indexed when the catalog is published
+    page = _search(client, "time to live")
+    ipv4 = next(item for item in page["items"] if item["catalog_slug"] == "ipv4")
+    assert "ttl" in ipv4["matched_fields"]
+
+
+def test_search_pages(client):
+    for number in range(3):
+        create_protocol(client, f"Quokka {number}")
+
+    page = _search(client, "quokka", limit=2)
+    assert page["total"] == 3
+    assert len(page["items"]) == 2
+
+    page = _search(client, "quokka", limit=2, offset=4)
+    assert page == {"total": 3, "items": []}
+
+
+def test_publish_indexes_catalog_published_before(client, catalog, db):
+    from src.crud.catalog import catalog_protocol_id, publish_catalog
+    from src.models import ProtocolField
+
+    protocol_id = catalog_protocol_id("tcp", "1.0")
+    db.query(ProtocolField).filter(ProtocolField.protocol_id == protocol_id).delete()
+    db.commit()
+
+    assert publish_catalog(db) == {"protocols": 0, "encapsulations": 0}
+    assert db.query(ProtocolField).filter(ProtocolField.protocol_id == protocol_id, ProtocolField.user_id.is_(None)).count() > 0
@@ -0,0 +1,74 @@
+from src.svg.metadata import parse_metadata
+from src.svg.optimizer import optimize_svg
+from tests.conftest import create_protocol, example_svg
+
+SVG = b"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:pd="http://www.protocoldescription.com" width="100" height="40">
+    <metadata>
+        <pd:info>
+            <pd:id>1</pd:id>
+            <pd:name>Test</pd:name>
+            <pd:author> </pd:author>
+            <pd:description>Test protocol</pd:description>
+            <pd:version>1.0</pd:version>
+            <pd:updated_at>1. 1. 2024</pd:updated_at>
+            <pd:created_at>1. 1. 2024</pd:created_at>
+        </pd:info>
+        <pd:field pd:display_name="Type" pd:id="type" pd:length="8" pd:endian="big"/>
+    </metadata>
+    <style>
+        /* fields */
+        rect.field {
+            fill: white;
+        }
+    </style>
+    <style>
+        /* fields */
+        rect.field { fill: white; }
+    </style>
+    <text x="0" y="20"><tspan>Source</tspan> <tspan>Port</tspan></text>
+</svg>
+"""
+
+
+def test_optimize_keeps_metadata_and_text():
+    optimized = optimize_svg(SVG)
+
+    assert len(optimized) < len(SVG)
+    assert b"/*" not in optimized
+    assert optimized.count(b"<style") == 1
+    assert b"rect.field{fill:white}" in optimized
+    assert b"<tspan>Source</tspan> <tspan>Port</tspan>" in optimized
+    assert b'xmlns:pd="http://www.protocoldescription.com"' in optimized
+
+    # Whitespace only metadata values are values, not formatting
+    assert b"<pd:author> </pd:author>" in optimized
+    assert parse_metadata(optimized) == parse_metadata(SVG)
+
+
+def test_upload_stores_original_and_optimized(client):
+    svg = example_svg("ipv4/IPv4.svg")
+    protocol = create_protocol(client, "IPv4")
+
+    response = client.post(f"/protocols/{protocol['id']}/upload", files={"file": ("protocol.svg", svg, "image/svg+xml")})
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    assert result["original_size"] == len(svg)
+    assert 0 < result["optimized_size"] < len(svg)
+
+    with open(f"static/{protocol['id']}.original.svg", "rb") as f:
+        assert f.read() == svg
+
+    with open(f"static/{protocol['id']}.svg", "rb") as f:
+        optimized = f.read()
+
+    assert len(optimized) == result["optimized_size"]
+    assert parse_metadata(optimized) == parse_metadata(svg)
+
+
+def test_upload_rejects_invalid_xml(client):
+    protocol = create_protocol(client)
+
+    response = client.post(f"/protocols/{protocol['id']}/upload", files={"file": ("protocol.svg", b"<svg", "image/svg+xml")})
+
+    assert response.status_code == 400
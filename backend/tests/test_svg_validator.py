@@ -0,0 +1,56 @@
+from src.svg.validator import validate_svg
+from tests.conftest import create_protocol, example_svg
+
+SVG = b"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:pd="http://www.protocoldescription.com">
+    <metadata>
+        <pd:info>
+            <pd:id>1</pd:id>
+            <pd:name>Test</pd:name>
+            <pd:author>Tester</pd:author>
+            <pd:description>Test protocol</pd:description>
+            <pd:version>1.0</pd:version>
+            <pd:updated_at>1. 1. 2024</pd:updated_at>
+            <pd:created_at>1. 1. 2024</pd:created_at>
+        </pd:info>
+        %s
+    </metadata>
+    <rect width="10" height="10"/>
+</svg>
+"""
+
+VALID_FIELD = b'<pd:field pd:display_name="Type" pd:id="type" pd:length="8" pd:endian="big"/>'
+FIELD_WITHOUT_LENGTH = b'<pd:field pd:display_name="Type" pd:id="type" pd:endian="big"/>'
+
+
+def test_valid_svgs():
+    assert validate_svg(SVG % VALID_FIELD) == []
+    assert validate_svg(example_svg("ipv4/IPv4.svg")) == []
+
+
+def test_invalid_field():
+    [error] = validate_svg(SVG % FIELD_WITHOUT_LENGTH)
+
+    assert error["element"] == "pd:field"
+    assert error["field_id"] == "type"
+    assert error["line"] == 12
+    assert "length" in error["message"]
+
+
+def test_missing_metadata():
+    assert validate_svg(b'<svg xmlns="http://www.w3.org/2000/svg"><rect/></svg>')[0]["message"].startswith("Missing <metadata>")
+    assert validate_svg(SVG.replace(b"<pd:info>", b"<pd:other>").replace(b"</pd:info>", b"</pd:other>") % VALID_FIELD)
+    assert validate_svg(b"<html/>")[0]["element"] == "html"
+    assert validate_svg(b'<svg xmlns="http://www.w3.org/2000/svg"><metadata>')[0]["message"].startswith("Malformed XML")
+
+
+def test_upload_rejects_invalid_metadata(client):
+    protocol = create_protocol(client)
+
+    response = client.post(f"/protocols/{protocol['id']}/upload", files={"file": ("protocol.svg", SVG % FIELD_WITHOUT_LENGTH, "image/svg+xml")})
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"][0]["field_id"] == "type"
+
+    response = client.post(f"/protocols/{protocol['id']}/upload", files={"file": ("protocol.svg", SVG % VALID_FIELD, "image/svg+xml")})
+
+    assert response.status_code == 200, response.text
@@ -66,11 +66,11 @@ const router = createRouter({
 
 router.beforeEach(
   async (to: RouteLocationNormalized, from: RouteLocationNormalized) => {
-    if (
-      to.path !== "/login" &&
-      to.path !== "/register" &&
-      !(await useAuthStore().isAuthenticated())
-    ) {
+    if (to.path === "/login" || to.path === "/register") {
+      return;
+    }
+
+    if (!(await useAuthStore().isAuthenticated())) {
       return { path: "/login" };
     }
 
@@ -78,7 +78,7 @@ router.beforeEach(
       return { path: "/upload" };
     }
 
-    useProtocolLibraryStore().loadAllProtocols();
+    useProtocolLibraryStore().syncProtocols();
   },
 );
 
@@ -2,6 +2,7 @@ import { User } from "@/contracts";
 import { defineStore } from "pinia";
 import axios, { Axios, AxiosError } from "axios";
 import { useNotificationStore } from "./NotificationStore";
+import { useProtocolLibraryStore } from "./ProtocolLibraryStore";
 
 export const useAuthStore = defineStore("AuthStore", {
   // State
@@ -83,6 +84,7 @@ export const useAuthStore = defineStore("AuthStore", {
       }
 
       // Clear local state
+      useProtocolLibraryStore().closeChangeFeed();
       this._authenticated = false;
       this.user = {} as User;
 
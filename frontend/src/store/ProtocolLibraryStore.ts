@@ -3,11 +3,14 @@ import { Protocol } from "@/contracts";
 import { v4 } from "uuid";
 import axios, { AxiosResponse } from "axios";
 import _ from "lodash";
+import { useProtocolStore } from "./ProtocolStore";
 
 export const useProtocolLibraryStore = defineStore("ProtocolLibraryStore", {
   // State
   state: () => ({
     protocols: [] as Protocol[],
+    changeFeed: null as EventSource | null,
+    lastChangeSeq: 0,
   }),
 
   // Actions
@@ -46,6 +49,104 @@ export const useProtocolLibraryStore = defineStore("ProtocolLibraryStore", {
       return true;
     },
 
+    /**
+     * Load the library once, then keep it fresh through the server change feed
+     * instead of reloading the whole list on every navigation
+     */
+    async syncProtocols() {
+      if (this.changeFeed) {
+        return true;
+      }
+
+      // Subscribe first, so changes made while the list is loading are not missed
+      this.subscribeToChanges();
+
+      return await this.loadAllProtocols();
+    },
+
+    /**
+     * Open the server-sent events change feed
+     */
+    subscribeToChanges() {
+      const since = this.lastChangeSeq ? `?since=${this.lastChangeSeq}` : "";
+
+      this.changeFeed = new EventSource(`${axios.defaults.baseURL}/changes${since}`, {
+        withCredentials: true,
+      });
+
+      this.changeFeed.addEventListener("changes", (event: MessageEvent) => {
+        this.lastChangeSeq = Number(event.lastEventId);
+        this.applyChanges(JSON.parse(event.data));
+      });
+
+      // The server dropped events for us, start over with a full reload
+      this.changeFeed.addEventListener("reset", () => {
+        this.closeChangeFeed();
+        this.syncProtocols();
+      });
+
+      // EventSource retries on its own unless the server refused the feed (e.g. 401),
+      // forget the closed feed so the next navigation subscribes again with a full reload
+      const changeFeed = this.changeFeed;
+      changeFeed.onerror = () => {
+        if (changeFeed.readyState === EventSource.CLOSED && this.changeFeed === changeFeed) {
+          this.closeChangeFeed();
+        }
+      };
+    },
+
+    /**
+     * Close the change feed, e.g. on logout
+     */
+    closeChangeFeed() {
+      this.changeFeed?.close();
+      this.changeFeed = null;
+      this.lastChangeSeq = 0;
+    },
+
+    /**
+     * Apply change feed deltas to the library
+     *
+     * @param changes coalesced changes, ordered by sequence number
+     */
+    async applyChanges(changes: { kind: string; protocol_id: string }[]) {
+      // Encapsulations are not part of the library list, but the open protocol may show them
+      const protocolStore = useProtocolStore();
+
+      if (
+        protocolStore.protocol.id &&
+        changes.some((change) => change.kind === "encapsulation_changed")
+      ) {
+        protocolStore.loadEncapsulatedProtocols();
+      }
+
+      for (const change of changes) {
+        const id = change.protocol_id as unknown as typeof v4;
+
+        if (change.kind === "deleted") {
+          this.protocols = this.protocols.filter((p) => p.id !== id);
+          continue;
+        }
+
+        if (change.kind !== "created" && change.kind !== "updated") {
+          continue;
+        }
+
+        try {
+          const result = await axios.get(`/protocols/${id}`);
+          const index = this.protocols.findIndex((p) => p.id === id);
+
+          if (index === -1) {
+            this.protocols.push(result.data);
+          } else {
+            this.protocols[index] = result.data;
+          }
+        } catch (error) {
+          console.error(error);
+        }
+      }
+    },
+
     /**
      * Add a protocol to the library
      *
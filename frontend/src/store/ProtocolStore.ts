@@ -6,6 +6,7 @@ import {
   AddFieldPosition,
   EncapsulatedProtocol,
 } from "@/contracts";
+import axios from "axios";
 
 export const useProtocolStore = defineStore("ProtocolStore", {
   // State
@@ -90,6 +91,30 @@ export const useProtocolStore = defineStore("ProtocolStore", {
         }
       });
     },
+
+    /**
+     * Load the protocols encapsulated in the current protocol
+     */
+    async loadEncapsulatedProtocols() {
+      const protocolId = this.protocol.id;
+
+      try {
+        const result = await axios.get(`/protocol-encapsulations/${protocolId}`);
+
+        // Another protocol was opened in the meantime
+        if (this.protocol.id !== protocolId) {
+          return;
+        }
+
+        this.encapsulatedProtocols = result.data.map((encapsulation: any) => ({
+          id: encapsulation.id,
+          protocol: encapsulation.protocol,
+          used_for_encapsulation_fields: encapsulation.fields ?? [],
+        }));
+      } catch (error) {
+        console.log(error);
+      }
+    },
   },
 
   // Getters